@@ -0,0 +1,325 @@
+import datetime
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+EVENT_DOCTYPE = "WhatsApp Conversation Event"
+
+# events are buffered per job, then appended to a capped redis stream
+EVENT_STREAM_MAX_LEN = 1_000_000
+EVENT_BATCH_SIZE = 5000
+EVENT_MAX_BATCHES_PER_RUN = 20
+
+EVENT_FIELDS = ["event_type", "wa_id", "msg_id", "from_stage", "to_stage", "hook", "status", "duration_ms"]
+
+STAGE_STAT_DOCTYPE = "WhatsApp Stage Stat"
+
+# stage transitions are counted in a redis hash per bot & hour, rolled up
+# into `WhatsApp Stage Stat` once the hour is over
+STAGE_WINDOW_SEC = 3600
+STAGE_COUNTER_TTL_SEC = 7 * 86400
+_STAGE_SEP = "\x1f"
+
+
+def _stream_key() -> str:
+    return frappe.cache.make_key(create_cache_key("events"))
+
+
+def events_enabled() -> bool:
+    return bool(frappe.utils.cint(frappe.db.get_single_value("ChatBot Config", "capture_events", cache=True)))
+
+
+def capture_event(event_type: str, **data) -> None:
+    """
+    Record a conversation event in the current batch.
+
+    A no-op outside `event_batch()`, so callers on the hot path only pay a lookup
+    when capture is disabled.
+    """
+    events = getattr(frappe.local, "pywce_events", None)
+
+    if events is None:
+        return
+
+    event = {"event_type": event_type, "ts": time.time()}
+    event.update({k: v for k, v in data.items() if v is not None})
+    events.append(event)
+
+
+def _publish(events: List[Dict[str, Any]]) -> None:
+    if not events:
+        return
+
+    try:
+        key = _stream_key()
+        pipe = frappe.cache.pipeline()
+
+        for event in events:
+            fields = {k: v if isinstance(v, (int, float)) else (json.dumps(v) if isinstance(v, (dict, list)) else str(v))
+                      for k, v in event.items()}
+            pipe.xadd(key, fields, maxlen=EVENT_STREAM_MAX_LEN, approximate=True)
+
+        pipe.execute()
+
+    except Exception:
+        logger.warning("Failed to publish %s conversation events", len(events), exc_info=True)
+
+
+@contextmanager
+def event_batch(enabled: bool = True):
+    """Buffer events captured in the block and publish them in one pipeline"""
+    if not enabled:
+        yield
+        return
+
+    frappe.local.pywce_events = []
+
+    try:
+        yield
+    finally:
+        events = frappe.local.pywce_events
+        frappe.local.pywce_events = None
+        _publish(events)
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _event_row(entry_id, entry: dict, now: str) -> list:
+    data = {_decode(k): _decode(v) for k, v in entry.items()}
+    ts = float(data.pop("ts", 0) or 0)
+
+    row = [_decode(entry_id)]
+
+    for field in EVENT_FIELDS:
+        value = data.pop(field, None)
+        if field == "duration_ms" and value is not None:
+            value = float(value)
+        row.append(value)
+
+    row.extend([
+        datetime.datetime.fromtimestamp(ts) if ts else now,
+        json.dumps(data) if data else None,
+        now, now, "Administrator", "Administrator"
+    ])
+
+    return row
+
+
+def flush_events(batch_size: int = EVENT_BATCH_SIZE, max_batches: int = EVENT_MAX_BATCHES_PER_RUN) -> int:
+    """
+    Scheduler job: move buffered events from the redis stream into
+    `WhatsApp Conversation Event` with bulk inserts.
+
+    Stream entry ids are used as document names so a retried batch is not duplicated.
+    """
+    key = _stream_key()
+    fields = ["name", *EVENT_FIELDS, "event_time", "data", "creation", "modified", "owner", "modified_by"]
+    flushed = 0
+
+    for _ in range(max_batches):
+        entries = frappe.cache.xrange(key, count=batch_size)
+
+        if not entries:
+            break
+
+        now = frappe.utils.now()
+        rows = [_event_row(entry_id, entry, now) for entry_id, entry in entries]
+
+        frappe.db.bulk_insert(EVENT_DOCTYPE, fields, rows, ignore_duplicates=True)
+        frappe.db.commit()
+
+        frappe.cache.xdel(key, *[entry_id for entry_id, _ in entries])
+        flushed += len(entries)
+
+        if len(entries) < batch_size:
+            break
+
+    if flushed:
+        logger.info("Flushed %s conversation events", flushed)
+
+    return flushed
+
+
+def stage_counters_enabled() -> bool:
+    return bool(frappe.utils.cint(frappe.db.get_single_value("ChatBot Config", "count_stages", cache=True)))
+
+
+def _stage_key(window: int, bot: Optional[str] = None) -> str:
+    return frappe.cache.make_key(create_cache_key(f"stages:{window}:{bot or ''}"))
+
+
+def _stage_pending_key() -> str:
+    """Set of `window:bot` counters not rolled up yet"""
+    return frappe.cache.make_key(create_cache_key("stages:pending"))
+
+
+def count_stage_change(from_stage: Optional[str], to_stage: str, bot: Optional[str] = None) -> None:
+    """
+    Count a stage transition in the current hour, one redis round trip.
+
+    Entries & exits of a stage are the sums of the transitions to and from it,
+    a transition from no stage is a new conversation.
+    """
+    if not to_stage or not stage_counters_enabled():
+        return
+
+    window = int(time.time() // STAGE_WINDOW_SEC)
+    key = _stage_key(window, bot)
+
+    try:
+        pipe = frappe.cache.pipeline(transaction=False)
+        pipe.hincrby(key, f"{from_stage or ''}{_STAGE_SEP}{to_stage}", 1)
+        pipe.expire(key, STAGE_COUNTER_TTL_SEC)
+        pipe.sadd(_stage_pending_key(), f"{window}:{bot or ''}")
+        pipe.execute()
+
+    except Exception:
+        logger.debug("Failed to count stage change to %s", to_stage, exc_info=True)
+
+
+def _transitions(raw: dict) -> Dict[Tuple[str, str], int]:
+    counts = {}
+
+    for field, value in raw.items():
+        from_stage, _, to_stage = _decode(field).partition(_STAGE_SEP)
+        counts[(from_stage, to_stage)] = int(value)
+
+    return counts
+
+
+def _window_start(window: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(window * STAGE_WINDOW_SEC)
+
+
+def _pending_windows() -> List[Tuple[int, str]]:
+    members = frappe.cache.pipeline().smembers(_stage_pending_key()).execute()[0]
+    windows = []
+
+    for member in members:
+        window, _, bot = _decode(member).partition(":")
+        windows.append((int(window), bot))
+
+    return windows
+
+
+def rollup_stage_counts() -> int:
+    """
+    Scheduler job: move the stage transition counters of past hours into `WhatsApp Stage Stat`.
+
+    Rows are named after their hour, bot & stages, so a retried rollup is not counted twice.
+    """
+    current = int(time.time() // STAGE_WINDOW_SEC)
+    fields = ["name", "bot", "window_start", "from_stage", "to_stage", "transitions", "creation", "modified", "owner", "modified_by"]
+    rolled = 0
+
+    for window, bot in _pending_windows():
+        if window >= current:
+            continue
+
+        key = _stage_key(window, bot)
+        counts = _transitions(frappe.cache.pipeline().hgetall(key).execute()[0])
+
+        if counts:
+            now = frappe.utils.now()
+            rows = [
+                [
+                    hashlib.blake2b(f"{window}:{bot}:{from_stage}{_STAGE_SEP}{to_stage}".encode("utf-8"), digest_size=16).hexdigest(),
+                    bot or None, _window_start(window), from_stage or None, to_stage, count,
+                    now, now, "Administrator", "Administrator"
+                ]
+                for (from_stage, to_stage), count in counts.items()
+            ]
+
+            frappe.db.bulk_insert(STAGE_STAT_DOCTYPE, fields, rows, ignore_duplicates=True)
+            frappe.db.commit()
+            rolled += len(rows)
+
+        frappe.cache.pipeline().delete(key).srem(_stage_pending_key(), f"{window}:{bot}").execute()
+
+    if rolled:
+        logger.info("Rolled up %s stage transition counts", rolled)
+
+    return rolled
+
+
+def stage_funnel(counts: Dict[Tuple[str, str], int]) -> Dict[str, Any]:
+    """
+    Funnel of transition counts keyed by (from_stage, to_stage), from_stage is "" for new conversations.
+
+    A stage is entered by the transitions to it and exited by the transitions
+    from it, what is left are drop offs.
+    """
+    stages = {}
+
+    for (from_stage, to_stage), count in counts.items():
+        stages.setdefault(to_stage, {"stage": to_stage, "entries": 0, "exits": 0})["entries"] += count
+
+        if from_stage:
+            stages.setdefault(from_stage, {"stage": from_stage, "entries": 0, "exits": 0})["exits"] += count
+
+    for stage in stages.values():
+        stage["drop_offs"] = max(stage["entries"] - stage["exits"], 0)
+
+    return {
+        "stages": sorted(stages.values(), key=lambda s: s["entries"], reverse=True),
+        "transitions": sorted(
+            ({"from_stage": f or None, "to_stage": t, "transitions": c} for (f, t), c in counts.items()),
+            key=lambda t: t["transitions"], reverse=True
+        )
+    }
+
+
+@frappe.whitelist()
+def get_stage_funnel(bot: str = None, from_date: str = None, to_date: str = None) -> Dict[str, Any]:
+    """
+    Stage funnel & transition heatmap of a bot, counters of the current hour included.
+
+    Returns:
+        stages: entries, exits & drop offs per stage, most entered first
+        transitions: counts per from & to stage, from_stage is None for new conversations
+    """
+    frappe.only_for("System Manager")
+
+    from_date = frappe.utils.get_datetime(from_date) if from_date else None
+    to_date = frappe.utils.get_datetime(to_date) if to_date else None
+
+    filters = [["bot", "=", bot] if bot else ["bot", "is", "not set"]]
+
+    if from_date:
+        filters.append(["window_start", ">=", from_date])
+
+    if to_date:
+        filters.append(["window_start", "<=", to_date])
+
+    counts = {}
+
+    for row in frappe.get_all(
+        STAGE_STAT_DOCTYPE,
+        filters=filters,
+        fields=["from_stage", "to_stage", "sum(transitions) as transitions"],
+        group_by="from_stage, to_stage"
+    ):
+        pair = (row.from_stage or "", row.to_stage)
+        counts[pair] = counts.get(pair, 0) + int(row.transitions or 0)
+
+    # hours not rolled up yet
+    for window, window_bot in _pending_windows():
+        start = _window_start(window)
+
+        if window_bot != (bot or "") or (from_date and start < from_date) or (to_date and start > to_date):
+            continue
+
+        for pair, count in _transitions(frappe.cache.pipeline().hgetall(_stage_key(window, window_bot)).execute()[0]).items():
+            counts[pair] = counts.get(pair, 0) + count
+
+    return stage_funnel(counts)
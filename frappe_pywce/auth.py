@@ -1,16 +1,95 @@
 from fnmatch import fnmatch
 import json
+from typing import Optional
+
 import frappe
 from frappe.auth import LoginManager
 import frappe.utils.data
 
-from pywce import SessionConstants
-
-from frappe_pywce.util import create_cache_key
-from frappe_pywce.security import verify_webhook_signature
+from frappe_pywce.bots import bot_profile, resolve_bot, set_current_bot
 from frappe_pywce.config import get_engine_config
+from frappe_pywce.security import verify_webhook_signature
+from frappe_pywce.sessions import auth_session_cache_key, whatsapp_session_name
 from frappe_pywce.pywce_logger import app_logger as logger
 
+def find_session_sid(webhook_data: dict, bot: str = None) -> Optional[str]:
+    """
+        Frappe session id of the WhatsApp user that sent the webhook, if the
+        user is logged in and the bot session still holds the same sid
+    """
+    # imported on use, this module is loaded by the auth hook on every request
+    from pywce import SessionConstants
+
+    engine = get_engine_config(bot)
+    wa_user = engine.config.whatsapp.util.get_wa_user(webhook_data)
+
+    if wa_user is None: return
+
+    session_cache_key = auth_session_cache_key(wa_user.wa_id, bot)
+
+    # attempt cache read
+    data = frappe.cache.get_value(session_cache_key)
+    
+    if data:
+        try:
+            cached = json.loads(data)
+            sid = cached.get("sid")
+
+            # expiry check
+            if cached.get("expires_on") and frappe.utils.data.get_datetime(cached["expires_on"]) < frappe.utils.data.now_datetime():
+                frappe.cache.delete_value(session_cache_key)
+                return
+            
+        except:
+            sid = None
+
+    else:
+        sid = None
+
+    # fallback to DB lookup
+    if not sid:
+        try:
+            doc = frappe.get_doc("WhatsApp Session", whatsapp_session_name(wa_user.wa_id, bot))
+            if doc.status != 'active': return
+            if doc.expires_on and frappe.utils.data.get_datetime(doc.expires_on) < frappe.utils.data.now_datetime():
+                doc.status = "expired"
+                doc.save(ignore_permissions=True)
+                return
+            
+            sid = doc.sid
+
+        except frappe.DoesNotExistError:
+            return
+        
+    if not sid:
+        return
+
+    session = engine.config.session_manager
+    auth_data = session.get(session_id=wa_user.wa_id, key=SessionConstants.VALID_AUTH_SESSION) or {}
+
+    if auth_data.get("sid") is None or auth_data.get("sid") != sid: return
+
+    return sid
+
+def mark_session_used(webhook_data: dict, bot: str = None) -> Optional[str]:
+    """Mark the WhatsApp Session last used & refresh its cache entry, returns the session user"""
+    try:
+        wa_user = get_engine_config(bot).config.whatsapp.util.get_wa_user(webhook_data)
+        doc = frappe.get_doc("WhatsApp Session", whatsapp_session_name(wa_user.wa_id, bot))
+        doc.last_used = frappe.utils.data.now_datetime()
+        doc.save(ignore_permissions=True)
+        # refresh cache
+        payload = json.dumps({"sid": doc.sid, "user": doc.user, "expires_on": doc.expires_on})
+        remaining = (frappe.utils.data.get_datetime(doc.expires_on) - frappe.utils.data.now_datetime()).total_seconds()
+
+        if remaining > 0:
+            frappe.cache.set_value(auth_session_cache_key(wa_user.wa_id, bot), payload, expires_in_sec=int(remaining))
+
+        return doc.user
+
+    except:
+        return None
+
 def whatsapp_session_hook():
     """
         check if its webhook request, check user session if available and resume-inject
@@ -29,64 +108,23 @@ def whatsapp_session_hook():
 
         try:
             raw_payload = frappe.request.data
+            webhook_data = json.loads(raw_payload.decode('utf-8'))
+            bot = resolve_bot(webhook_data)
 
-            if not verify_webhook_signature(frappe.request):
+            if not verify_webhook_signature(frappe.request, bot_profile(bot)):
                 logger.warning(f"WhatsApp hook signature failed: %s", raw_payload)
                 return
         
-            webhook_data = json.loads(raw_payload.decode('utf-8'))
         except:
             logger.error("Signature verification error", exc_info=True) 
             return
-        
-        wa_user = get_engine_config().config.whatsapp.util.get_wa_user(webhook_data)
-
-        if wa_user is None: return
 
-        session_cache_key = create_cache_key(f"session:{wa_user.wa_id}")
+        set_current_bot(bot)
+        sid = find_session_sid(webhook_data, bot)
 
-        # attempt cache read
-        data = frappe.cache.get_value(session_cache_key)
-        
-        if data:
-            try:
-                cached = json.loads(data)
-                sid = cached.get("sid")
-
-                # expiry check
-                if cached.get("expires_on") and frappe.utils.data.get_datetime(cached["expires_on"]) < frappe.utils.data.now_datetime():
-                    frappe.cache.delete_value(session_cache_key)
-                    return
-                
-            except:
-                sid = None
-
-        else:
-            sid = None
-
-        # fallback to DB lookup
-        if not sid:
-            try:
-                doc = frappe.get_doc("WhatsApp Session", wa_user.wa_id)
-                if doc.status != 'active': return
-                if doc.expires_on and frappe.utils.data.get_datetime(doc.expires_on) < frappe.utils.data.now_datetime():
-                    doc.status = "expired"
-                    doc.save(ignore_permissions=True)
-                    return
-                
-                sid = doc.sid
-
-            except frappe.DoesNotExistError:
-                return
-            
         if not sid:
             return
 
-        session = get_engine_config().config.session_manager
-        auth_data = session.get(session_id=wa_user.wa_id, key=SessionConstants.VALID_AUTH_SESSION) or {}
-
-        if auth_data.get("sid") is None or auth_data.get("sid") != sid: return
-
         # Inject for session resumption
         frappe.local.form_dict["sid"] = sid
 
@@ -98,20 +136,7 @@ def whatsapp_session_hook():
             logger.error("Injected sid, LoginManager rebootstrap error", exc_info=True)
             return
 
-        # mark last used
-        try:
-            doc = frappe.get_doc("WhatsApp Session", wa_user.wa_id)
-            doc.last_used = frappe.utils.data.now_datetime()
-            doc.save(ignore_permissions=True)
-            # refresh cache
-            payload = json.dumps({"sid": doc.sid, "user": doc.user, "expires_on": doc.expires_on})
-            remaining = (frappe.utils.data.get_datetime(doc.expires_on) - frappe.utils.data.now_datetime()).total_seconds()
-
-            if remaining > 0:
-                frappe.cache.set_value(session_cache_key, payload, expires_in_sec=int(remaining))
-
-        except:
-            pass
+        mark_session_used(webhook_data, bot)
 
         # may do further cleanup
         # frappe.local.form_dict.pop("sid", None)
@@ -0,0 +1,99 @@
+from typing import Optional
+
+import frappe
+
+from frappe_pywce.pywce_logger import app_logger as logger
+
+PROFILE_DOCTYPE = "ChatBot Profile"
+
+# phone_number_id -> profile name, shared across workers
+PROFILE_CACHE_KEY = "fpw:bot_profiles"
+
+DEFAULT_QUEUE = "default"
+
+
+def phone_number_id(payload: dict) -> Optional[str]:
+    """Business phone number id the webhook was sent to, from `entry[].changes[].value.metadata`"""
+    try:
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                metadata = (change.get("value") or {}).get("metadata") or {}
+
+                if metadata.get("phone_number_id"):
+                    return str(metadata["phone_number_id"])
+
+    except AttributeError:
+        pass
+
+    return None
+
+
+def _profile_for_phone_id(phone_id: str) -> Optional[str]:
+    """Profile name for the phone id, None when no profile is bound to it"""
+    return frappe.db.get_value(PROFILE_DOCTYPE, {"phone_id": phone_id}, "name")
+
+
+def bot_for_phone_id(phone_id: Optional[str]) -> Optional[str]:
+    """
+    Resolve the `ChatBot Profile` serving a phone number id.
+
+    Returns None when no profile is bound to it, the webhook is then handled
+    by the default `ChatBot Config` bot.
+    """
+    if not phone_id:
+        return None
+
+    bot = frappe.cache.hget(PROFILE_CACHE_KEY, phone_id)
+
+    if bot is None:
+        bot = _profile_for_phone_id(phone_id)
+
+        # the phone id comes from the payload before its signature is checked,
+        # only ids bound to a profile are cached so the hash stays bounded
+        if bot:
+            frappe.cache.hset(PROFILE_CACHE_KEY, phone_id, bot)
+
+    return bot or None
+
+
+def resolve_bot(payload: dict) -> Optional[str]:
+    return bot_for_phone_id(phone_number_id(payload))
+
+
+def current_bot() -> Optional[str]:
+    """Bot profile of the webhook being processed, None for the default bot"""
+    return getattr(frappe.local, "pywce_bot", None)
+
+
+def set_current_bot(bot: Optional[str]) -> None:
+    frappe.local.pywce_bot = bot
+
+
+def bot_profile(bot: Optional[str] = None):
+    """
+    WhatsApp credentials & flow of a bot.
+
+    The default bot is served by `ChatBot Config`, profiles share its logging,
+    analytics and session settings.
+    """
+    if not bot:
+        return frappe.get_cached_doc("ChatBot Config")
+
+    return frappe.get_cached_doc(PROFILE_DOCTYPE, bot)
+
+
+def bot_queue(profile) -> str:
+    return profile.get("queue") or DEFAULT_QUEUE
+
+
+def bot_for_verify_token(token: str) -> Optional[str]:
+    """Profile whose webhook verify token matches, for the GET webhook challenge"""
+    if not token:
+        return None
+
+    return frappe.db.get_value(PROFILE_DOCTYPE, {"webhook_token": token, "enabled": 1}, "name")
+
+
+def clear_bot_cache() -> None:
+    frappe.cache.delete_value(PROFILE_CACHE_KEY)
+    logger.debug("Bot profile cache cleared")
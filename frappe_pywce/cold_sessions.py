@@ -0,0 +1,189 @@
+import base64
+import hashlib
+import time
+import zlib
+from typing import List, Optional
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import SESSION_TTL_SEC, create_cache_key
+
+COLD_SESSION_DOCTYPE = "WhatsApp Cold Session"
+
+# idle sessions are frozen by a scheduler job every FREEZE_INTERVAL_SEC,
+# well before redis expires them
+DEFAULT_COLD_AFTER_MIN = 10
+FREEZE_INTERVAL_SEC = 300
+FREEZE_BATCH_SIZE = 500
+FREEZE_MAX_BATCHES = 20
+
+# unlink the given session keys still idle since the cutoff, returns the unlinked ones.
+# a session written after it was read for freezing has a newer score and is kept
+_UNLINK_IDLE_LUA = """
+local cutoff = tonumber(ARGV[1])
+local frozen = {}
+
+for i = 2, #KEYS do
+    local score = redis.call('ZSCORE', KEYS[1], KEYS[i])
+
+    if score and tonumber(score) <= cutoff then
+        redis.call('UNLINK', KEYS[i])
+        redis.call('ZREM', KEYS[1], KEYS[i])
+        table.insert(frozen, KEYS[i])
+    end
+end
+
+return frozen
+"""
+
+_script = {}
+
+
+def cold_tier_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("cold_sessions")))
+
+
+def _cold_after_sec(settings) -> int:
+    cold_after = (frappe.utils.cint(settings.get("cold_after_min")) or DEFAULT_COLD_AFTER_MIN) * 60
+    return min(cold_after, SESSION_TTL_SEC - 2 * FREEZE_INTERVAL_SEC)
+
+
+def _index_key() -> str:
+    """Sorted set of session keys by last write time"""
+    return frappe.cache.make_key(create_cache_key("session_activity"))
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _row_name(key: str) -> str:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _unlink_idle():
+    if "unlink" not in _script:
+        _script["unlink"] = frappe.cache.register_script(_UNLINK_IDLE_LUA)
+
+    return _script["unlink"]
+
+
+def touch_session(pipe, key: str) -> None:
+    """Record a session write on the given pipeline, queue it before the write itself"""
+    pipe.zadd(_index_key(), {key: time.time()})
+
+
+def _freeze_batch(keys: List[str], cutoff: float) -> int:
+    index = _index_key()
+    pipe = frappe.cache.pipeline()
+
+    for key in keys:
+        pipe.get(key)
+
+    blobs = dict(zip(keys, pipe.execute()))
+    gone = [key for key, blob in blobs.items() if blob is None]
+
+    if gone:
+        # expired or of an older session generation
+        frappe.cache.zrem(index, *gone)
+
+    rows = {_row_name(key): (key, blob) for key, blob in blobs.items() if blob is not None}
+
+    if not rows:
+        return 0
+
+    now = frappe.utils.now()
+    frappe.db.delete(COLD_SESSION_DOCTYPE, {"name": ("in", list(rows))})
+    frappe.db.bulk_insert(
+        COLD_SESSION_DOCTYPE,
+        fields=["name", "creation", "modified", "owner", "modified_by", "session_key", "size", "data"],
+        values=[
+            (name, now, now, "Administrator", "Administrator", key, len(blob),
+             base64.b64encode(zlib.compress(blob)).decode("ascii"))
+            for name, (key, blob) in rows.items()
+        ]
+    )
+
+    # sessions are only unlinked from redis once safely stored
+    frappe.db.commit()
+
+    frozen = {_decode(k) for k in _unlink_idle()(keys=[index, *(key for key, _ in rows.values())], args=[cutoff], client=frappe.cache)}
+    active = [name for name, (key, _) in rows.items() if key not in frozen]
+
+    if active:
+        frappe.db.delete(COLD_SESSION_DOCTYPE, {"name": ("in", active)})
+        frappe.db.commit()
+
+    return len(frozen)
+
+
+def freeze_idle_sessions(batch_size: int = FREEZE_BATCH_SIZE, max_batches: int = FREEZE_MAX_BATCHES) -> int:
+    """
+    Scheduler job: move user sessions idle past `cold_after_min` from redis to the database.
+
+    Sessions are compressed and written in batches, then rehydrated by
+    `FrappeRedisSessionManager` on the user's next message.
+    """
+    settings = frappe.get_cached_doc("ChatBot Config")
+
+    if not cold_tier_enabled(settings):
+        return 0
+
+    cutoff = time.time() - _cold_after_sec(settings)
+    frozen = 0
+
+    for _ in range(max_batches):
+        keys = [_decode(k) for k in frappe.cache.zrangebyscore(_index_key(), "-inf", cutoff, start=0, num=batch_size)]
+
+        if not keys:
+            break
+
+        frozen += _freeze_batch(keys, cutoff)
+
+        if len(keys) < batch_size:
+            break
+
+    if frozen:
+        logger.info("Moved %s idle sessions to cold storage", frozen)
+
+    return frozen
+
+
+def thaw_session(key: str, ttl: int) -> Optional[bytes]:
+    """
+    Rehydrate a frozen session into redis, returns its blob or None when not frozen.
+
+    The database is checked once per request / job for a given key.
+    """
+    checked = getattr(frappe.local, "pywce_cold_checked", None)
+
+    if checked is None:
+        checked = frappe.local.pywce_cold_checked = set()
+
+    if key in checked:
+        return None
+
+    checked.add(key)
+    name = _row_name(key)
+    data = frappe.db.get_value(COLD_SESSION_DOCTYPE, name, "data")
+
+    if not data:
+        return None
+
+    blob = zlib.decompress(base64.b64decode(data))
+
+    pipe = frappe.cache.pipeline()
+    touch_session(pipe, key)
+    pipe.set(key, blob, ex=ttl)
+    pipe.execute()
+
+    frappe.db.delete(COLD_SESSION_DOCTYPE, {"name": name})
+    return blob
+
+
+def drop_cold_session(key: str) -> None:
+    """Forget a session in both tiers' bookkeeping, e.g. when it is cleared"""
+    frappe.cache.zrem(_index_key(), key)
+    frappe.db.delete(COLD_SESSION_DOCTYPE, {"name": _row_name(key)})
@@ -0,0 +1,79 @@
+import json
+import statistics
+import subprocess
+import sys
+
+import click
+import frappe
+from frappe.commands import pass_context
+from frappe.exceptions import SiteNotSpecifiedError
+
+
+@click.command("pywce-warm-up")
+@pass_context
+def warm_up(context):
+    """Build the chatbot engines, flows, hooks & templates of the site, e.g. after a deploy"""
+    from frappe_pywce.warmup import warm_up as _warm_up
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+
+        try:
+            click.echo(f"{site}: {json.dumps(_warm_up(), indent=1)}")
+        finally:
+            frappe.destroy()
+
+
+# modules loaded by processes that may never handle a webhook:
+# hooks, the auth hook, scheduler jobs & doctype controllers
+IMPORT_TIME_MODULES = [
+    "frappe_pywce.hooks",
+    "frappe_pywce.auth",
+    "frappe_pywce.webhook",
+    "frappe_pywce.analytics",
+    "frappe_pywce.sessions",
+    "frappe_pywce.warmup",
+    "frappe_pywce.frappe_pywce.doctype.chatbot_config.chatbot_config",
+    "frappe_pywce.frappe_pywce.doctype.chatbot_profile.chatbot_profile",
+]
+
+# the engine, imported on first webhook use
+ENGINE_MODULES = ["frappe_pywce.managers"]
+
+_IMPORT_TIME_SCRIPT = """
+import sys, time
+import frappe
+started_at = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+print(round((time.perf_counter() - started_at) * 1000, 2), int("pywce" in sys.modules))
+"""
+
+
+def _time_imports(modules, runs: int) -> tuple:
+    """Median import time in ms over fresh interpreters, and whether pywce got imported"""
+    timings, loaded = [], False
+
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_TIME_SCRIPT, *modules], capture_output=True, text=True, check=True)
+        ms, pywce_loaded = out.stdout.split()
+        timings.append(float(ms))
+        loaded = loaded or pywce_loaded == "1"
+
+    return statistics.median(timings), loaded
+
+
+@click.command("pywce-import-time")
+@click.option("--runs", default=5, help="fresh interpreters to time, the median is reported")
+def import_time(runs):
+    """Time importing the app modules every bench process loads, against the engine"""
+    for label, modules in (("app", IMPORT_TIME_MODULES), ("engine", ENGINE_MODULES)):
+        ms, loaded = _time_imports(modules, runs)
+        click.echo(f"{label}: {ms:.2f}ms, pywce imported: {'yes' if loaded else 'no'}")
+
+
+commands = [warm_up, import_time]
@@ -1,30 +1,66 @@
+from typing import TYPE_CHECKING
+
 import frappe
 
-from frappe_pywce.managers import FrappeRedisSessionManager, FrappeStorageManager
-from frappe_pywce.util import bot_settings, frappe_recursive_renderer
-from frappe_pywce.pywce_logger import app_logger
+from frappe_pywce.bots import bot_profile
+from frappe_pywce.flows import active_flow
+from frappe_pywce.util import frappe_recursive_renderer
+from frappe_pywce.pywce_logger import app_logger, setup_pywce_logging_for_frappe
+from frappe_pywce.tracing import current_trace_id, span
 
-from pywce import Engine, client, EngineConfig, HookArg
+# pywce & the engine modules are imported on first use, not by every
+# process that loads this app
+if TYPE_CHECKING:
+    from pywce import Engine, client, HookArg
 
 
 LOCAL_EMULATOR_URL = "http://localhost:3001/send-to-emulator"
 
-def on_hook_listener(arg: HookArg) -> None:
+# per-process engines: (site, bot) -> (settings version, engine)
+_ENGINES = {}
+
+# WhatsApp client class, defined on first use with pywce
+_CLIENT_CLASS = {}
+
+def on_hook_listener(arg: "HookArg") -> None:
     """Save hook to local
 
     arg = getattr(frappe.local, "hook_arg", None)
     
+    The trace id of the message, if traced, is passed to hooks as `arg.params["trace_id"]`.
+
     Args:
         arg (HookArg): Hook argument
     """
+    trace_id = current_trace_id()
+
+    if trace_id:
+        # copied, params may be the template's own dict
+        arg.params = {**(arg.params or {}), "trace_id": trace_id}
+
     frappe.local.hook_arg = arg
-    print('[on_hook_listener] Updated hook arg in frappe > local')
 
 def on_client_send_listener() -> None:
     """reset hook_arg to None"""
     frappe.local.hook_arg = None
 
-def get_wa_config(settings) -> client.WhatsApp:
+def _whatsapp_class():
+    """`client.WhatsApp` timing outbound Graph API calls as trace spans"""
+    if "cls" not in _CLIENT_CLASS:
+        from pywce import client
+
+        class TracedWhatsApp(client.WhatsApp):
+            def _send_request(self, message_type, recipient_id, data):
+                with span("whatsapp.send", message_type=message_type):
+                    return super()._send_request(message_type, recipient_id, data)
+
+        _CLIENT_CLASS["cls"] = TracedWhatsApp
+
+    return _CLIENT_CLASS["cls"]
+
+def get_wa_config(settings) -> "client.WhatsApp":
+    from pywce import client
+
     _wa_config = client.WhatsAppConfig(
         token=settings.access_token,
         phone_number_id=settings.phone_id,
@@ -34,28 +70,60 @@ def get_wa_config(settings) -> client.WhatsApp:
         emulator_url=LOCAL_EMULATOR_URL
     )
 
-    return client.WhatsApp(_wa_config, on_send_listener=on_client_send_listener)
+    return _whatsapp_class()(_wa_config, on_send_listener=on_client_send_listener)
+
+
+def _build_engine(settings, profile, bot: str = None) -> "Engine":
+    from pywce import Engine, EngineConfig
+
+    from frappe_pywce.managers import FrappeRedisSessionManager, FrappeStorageManager
+    from frappe_pywce.serializers import SessionSerializer
+    from frappe_pywce.session_budget import SessionBudget
+
+    storage_manager = FrappeStorageManager(active_flow(profile))
+    wa = get_wa_config(profile)
+
+    _eng_config = EngineConfig(
+        whatsapp=wa,
+        storage_manager=storage_manager,
+        start_template_stage=storage_manager.START_MENU,
+        report_template_stage=storage_manager.REPORT_MENU,
+        session_manager=FrappeRedisSessionManager(
+            serializer=SessionSerializer.from_settings(settings),
+            budget=SessionBudget.from_settings(settings),
+            namespace=bot
+        ),
+        external_renderer=frappe_recursive_renderer,
+        on_hook_arg=on_hook_listener
+    )
+
+    return Engine(config=_eng_config)
 
 
-def get_engine_config() -> Engine:
+def get_engine_config(bot: str = None) -> "Engine":
+    """
+    Engine of the given bot profile, or of the default `ChatBot Config` bot.
 
+    Engines are cached per process and rebuilt when the bot profile
+    or the app settings are saved.
+    """
     try:
-        settings = bot_settings()
-        storage_manager = FrappeStorageManager(settings.flow_json)
-        wa = get_wa_config(settings)
-
-        _eng_config = EngineConfig(
-            whatsapp=wa,
-            storage_manager=storage_manager,
-            start_template_stage=storage_manager.START_MENU,
-            report_template_stage=storage_manager.REPORT_MENU,
-            session_manager=FrappeRedisSessionManager(),
-            external_renderer=frappe_recursive_renderer,
-            on_hook_arg=on_hook_listener
-        )
-
-        return Engine(config=_eng_config)
+        settings = frappe.get_cached_doc("ChatBot Config")
+        profile = bot_profile(bot)
+        setup_pywce_logging_for_frappe(settings)
+
+        cache_key = (getattr(frappe.local, "site", None), bot)
+        version = (str(settings.modified), str(profile.modified))
+        cached = _ENGINES.get(cache_key)
+
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        engine = _build_engine(settings, profile, bot)
+        _ENGINES[cache_key] = (version, engine)
+
+        return engine
 
     except Exception as e:
         app_logger.error("Failed to load engine config", exc_info=True)
-        frappe.throw("Failed to load engine config", exc=e)
\ No newline at end of file
+        frappe.throw("Failed to load engine config", exc=e)
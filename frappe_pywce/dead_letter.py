@@ -0,0 +1,181 @@
+import json
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger, report_error
+from frappe_pywce.sessions import create_cache_key
+
+DEAD_LETTER_DOCTYPE = "WhatsApp Dead Letter"
+DEAD_LETTER_STREAM_MAX_LEN = 100_000
+ERROR_MAX_LENGTH = 10_000
+
+DEFAULT_REPLAY_CONCURRENCY = 4
+DEFAULT_REPLAY_LIMIT = 1000
+REPLAY_QUEUE = "long"
+
+# ingress payloads that failed before reaching a conversation queue
+INGRESS_REASON = "ingress"
+
+# job kwargs kept for replay
+_JOB_FIELDS = ("wa_id", "payload", "msg_id", "bot", "trace_id")
+
+
+def _stream_key() -> str:
+    return frappe.cache.make_key(create_cache_key("dead_letters"))
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _keep_documents() -> bool:
+    return bool(frappe.utils.cint(frappe.get_cached_doc("ChatBot Config").get("dead_letter_documents")))
+
+
+def dead_letter(reason: str, job: Dict[str, Any], error: str = None, attempt: int = 1) -> Optional[str]:
+    """
+    Keep the payload of a failed or dropped webhook job for replay.
+
+    Entries go to a capped redis stream, mirrored as `WhatsApp Dead Letter`
+    documents when enabled in `ChatBot Config`. Returns the stream entry id.
+    """
+    error = (error or "")[-ERROR_MAX_LENGTH:]
+    job = {k: job.get(k) for k in _JOB_FIELDS}
+
+    try:
+        entry_id = _decode(frappe.cache.xadd(
+            _stream_key(),
+            {"job": json.dumps(job), "reason": reason, "error": error, "attempt": attempt, "failed_at": time.time()},
+            maxlen=DEAD_LETTER_STREAM_MAX_LEN, approximate=True
+        ))
+
+    except Exception:
+        logger.error("Failed to dead letter message %s of %s", job.get("msg_id"), job.get("wa_id"), exc_info=True)
+        return None
+
+    if _keep_documents():
+        try:
+            frappe.get_doc({
+                "doctype": DEAD_LETTER_DOCTYPE,
+                "stream_id": entry_id,
+                "wa_id": job.get("wa_id"),
+                "msg_id": job.get("msg_id"),
+                "bot": job.get("bot"),
+                "reason": reason,
+                "attempt": attempt,
+                "status": "Pending",
+                "error": error,
+                "payload": json.dumps(job.get("payload"), indent=1)
+            }).insert(ignore_permissions=True)
+
+        except Exception:
+            logger.warning("Failed to save dead letter document for %s", entry_id, exc_info=True)
+
+    return entry_id
+
+
+def _parse(entry_id, fields: dict) -> Dict[str, Any]:
+    fields = {_decode(k): v for k, v in fields.items()}
+
+    return {
+        "id": _decode(entry_id),
+        "job": json.loads(fields["job"]),
+        "reason": _decode(fields.get("reason")),
+        "error": _decode(fields.get("error")),
+        "attempt": frappe.utils.cint(fields.get("attempt")) or 1,
+        "failed_at": frappe.utils.flt(fields.get("failed_at"))
+    }
+
+
+def read_dead_letters(limit: int = DEFAULT_REPLAY_LIMIT, bot: str = None) -> List[Dict[str, Any]]:
+    """Oldest dead letters first, optionally of one bot profile"""
+    entries = [_parse(entry_id, fields) for entry_id, fields in frappe.cache.xrange(_stream_key(), count=limit)]
+
+    if bot is not None:
+        entries = [e for e in entries if (e["job"].get("bot") or "") == bot]
+
+    return entries
+
+
+def _lanes(entries: List[Dict[str, Any]], concurrency: int) -> List[List[str]]:
+    """
+    Split entries in at most `concurrency` lanes, all messages of a user in the same lane.
+
+    Lanes keep the stream order, so each user's messages are replayed oldest first.
+    """
+    lanes = [[] for _ in range(max(concurrency, 1))]
+
+    for entry in entries:
+        user = f"{entry['job'].get('bot') or ''}:{entry['job'].get('wa_id')}"
+        lanes[zlib.crc32(user.encode("utf-8")) % len(lanes)].append(entry["id"])
+
+    return [lane for lane in lanes if lane]
+
+
+def _set_document_status(entry_id: str, status: str) -> None:
+    name = frappe.db.get_value(DEAD_LETTER_DOCTYPE, {"stream_id": entry_id}, "name")
+
+    if name:
+        frappe.db.set_value(DEAD_LETTER_DOCTYPE, name, "status", status, update_modified=False)
+
+
+def _replay_lane(entry_ids: List[str]) -> None:
+    """Replay one lane serially, failures are dead lettered again with the next attempt number"""
+    from frappe_pywce.webhook import _internal_webhook_handler, dispatch_webhook
+
+    key = _stream_key()
+
+    for entry_id in entry_ids:
+        found = frappe.cache.xrange(key, min=entry_id, max=entry_id)
+
+        if not found:
+            continue
+
+        entry = _parse(*found[0])
+
+        if entry["reason"] == INGRESS_REASON:
+            # routed & enqueued again like a new delivery
+            try:
+                dispatch_webhook(entry["job"]["payload"])
+                status = "ok"
+
+            except Exception:
+                status = "error"
+                report_error(title="Chatbot Ingress Replay")
+                dead_letter(INGRESS_REASON, entry["job"], error=frappe.get_traceback(), attempt=entry["attempt"] + 1)
+
+        else:
+            status = _internal_webhook_handler(**entry["job"], attempt=entry["attempt"] + 1)
+
+        frappe.cache.xdel(key, entry_id)
+        _set_document_status(entry_id, "Replayed" if status == "ok" else "Failed")
+        frappe.db.commit()
+
+
+@frappe.whitelist()
+def get_dead_letters(limit: int = 100, bot: str = None) -> List[Dict[str, Any]]:
+    frappe.only_for("System Manager")
+    return read_dead_letters(frappe.utils.cint(limit), bot)
+
+
+@frappe.whitelist()
+def replay_dead_letters(concurrency: int = DEFAULT_REPLAY_CONCURRENCY, limit: int = DEFAULT_REPLAY_LIMIT, bot: str = None) -> Dict[str, int]:
+    """
+    Reprocess dead letters, e.g. once the cause of an incident is fixed.
+
+    Entries are spread over `concurrency` jobs on the long queue, each user's
+    messages stay in one job and are replayed in order.
+    """
+    frappe.only_for("System Manager")
+
+    entries = read_dead_letters(frappe.utils.cint(limit) or DEFAULT_REPLAY_LIMIT, bot)
+    lanes = _lanes(entries, frappe.utils.cint(concurrency) or DEFAULT_REPLAY_CONCURRENCY)
+
+    for lane in lanes:
+        frappe.enqueue(_replay_lane, queue=REPLAY_QUEUE, entry_ids=lane)
+
+    return {"messages": len(entries), "jobs": len(lanes)}
@@ -0,0 +1,150 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+import frappe
+
+from frappe_pywce.bots import PROFILE_DOCTYPE, bot_profile
+
+FLOW_VERSION_DOCTYPE = "ChatBot Flow Version"
+CONFIG_DOCTYPE = "ChatBot Config"
+
+# per-process flow bodies by version name. Versions are never edited, so
+# entries stay valid, the least recently loaded beyond FLOW_BODY_CACHE_SIZE are dropped
+FLOW_BODY_CACHE_SIZE = 16
+_FLOW_BODIES: Dict[str, str] = {}
+
+
+def content_hash(flow_json) -> str:
+    """Hash of a flow's content, independent of json formatting & key order"""
+    data = json.loads(flow_json) if isinstance(flow_json, str) else flow_json
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _bot_filter(bot: Optional[str]):
+    return bot if bot else ["is", "not set"]
+
+
+def flow_body(version: Optional[str]) -> Optional[str]:
+    """Flow json of a version, read from the database once per process"""
+    if not version:
+        return None
+
+    body = _FLOW_BODIES.get(version)
+
+    if body is None:
+        body = frappe.db.get_value(FLOW_VERSION_DOCTYPE, version, "flow_json")
+
+        if body is None:
+            return None
+
+        if len(_FLOW_BODIES) >= FLOW_BODY_CACHE_SIZE:
+            _FLOW_BODIES.pop(next(iter(_FLOW_BODIES)))
+
+        _FLOW_BODIES[version] = body
+
+    return body
+
+
+def active_flow(profile) -> Optional[str]:
+    """Flow json of the active version of a `ChatBot Config` or `ChatBot Profile`"""
+    return flow_body(profile.get("active_flow_version"))
+
+
+def save_flow_version(flow_json, bot: Optional[str] = None) -> str:
+    """Store a bot's flow as a new version, or return the version with the same content"""
+    if not isinstance(flow_json, str):
+        flow_json = json.dumps(flow_json, indent=2)
+
+    existing = frappe.db.get_value(
+        FLOW_VERSION_DOCTYPE,
+        {"bot": _bot_filter(bot), "content_hash": content_hash(flow_json)},
+        "name"
+    )
+
+    if existing:
+        return existing
+
+    return frappe.get_doc({
+        "doctype": FLOW_VERSION_DOCTYPE,
+        "bot": bot,
+        "flow_json": flow_json
+    }).insert(ignore_permissions=True).name
+
+
+def activate_flow_version(version: str, bot: Optional[str] = None) -> None:
+    """Point a bot at one of its flow versions, its engine is rebuilt on the next message"""
+    doc = frappe.get_doc(PROFILE_DOCTYPE, bot) if bot else frappe.get_single(CONFIG_DOCTYPE)
+
+    if doc.active_flow_version != version:
+        doc.active_flow_version = version
+        doc.save(ignore_permissions=True)
+
+
+def check_flow_version(version: Optional[str], bot: Optional[str] = None) -> None:
+    """Validate that a flow version belongs to the bot it is activated for"""
+    if not version:
+        return
+
+    owner = frappe.db.get_value(FLOW_VERSION_DOCTYPE, version, "bot")
+
+    if (owner or None) != (bot or None):
+        frappe.throw(frappe._("Flow version {0} belongs to another bot").format(version))
+
+
+def _nodes(flow_json) -> Dict[str, str]:
+    """Studio node content hash by template name, canvas positions ignored"""
+    data = json.loads(flow_json) if isinstance(flow_json, str) else (flow_json or {})
+    nodes = {}
+
+    for tpl in data.get("templates", []) or []:
+        if tpl.get("name"):
+            content = {k: v for k, v in tpl.items() if k != "position"}
+            nodes[tpl["name"]] = content_hash(content)
+
+    return nodes
+
+
+@frappe.whitelist()
+def get_flow(bot: str = None) -> Dict[str, Any]:
+    """Active flow of a bot, for the studio"""
+    frappe.only_for("System Manager")
+
+    version = bot_profile(bot).get("active_flow_version")
+    return {"version": version, "flow_json": flow_body(version)}
+
+
+@frappe.whitelist(methods=["POST"])
+def save_flow(flow_json: str, bot: str = None) -> str:
+    """Save a flow from the studio as the active version of a bot"""
+    frappe.only_for("System Manager")
+
+    version = save_flow_version(flow_json, bot)
+    activate_flow_version(version, bot)
+
+    return version
+
+
+@frappe.whitelist(methods=["POST"])
+def activate_flow(version: str) -> str:
+    """Make a stored version the active flow of its bot, e.g. to roll back"""
+    frappe.only_for("System Manager")
+
+    activate_flow_version(version, frappe.db.get_value(FLOW_VERSION_DOCTYPE, version, "bot"))
+    return version
+
+
+@frappe.whitelist()
+def diff_flow_versions(from_version: str, to_version: str) -> Dict[str, List[str]]:
+    """Templates added, removed & changed between two flow versions"""
+    frappe.only_for("System Manager")
+
+    before = _nodes(flow_body(from_version))
+    after = _nodes(flow_body(to_version))
+
+    return {
+        "added": sorted(set(after) - set(before)),
+        "removed": sorted(set(before) - set(after)),
+        "changed": sorted(name for name in set(before) & set(after) if before[name] != after[name])
+    }
@@ -4,6 +4,10 @@
 frappe.ui.form.on("ChatBot Config", {
   setup: function (frm) {
     frm.trigger("setup_help");
+
+    frm.set_query("active_flow_version", () => ({
+      filters: { bot: ["is", "not set"] },
+    }));
   },
   refresh: function (frm) {
     frm.add_custom_button(__("View Webhook Url"), function () {
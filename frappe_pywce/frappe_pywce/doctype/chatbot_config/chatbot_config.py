@@ -1,8 +1,16 @@
 # Copyright (c) 2025, donnc and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from frappe_pywce.flows import check_flow_version
+from frappe_pywce.load_shedding import SHED_BUSY_REPLY, busy_reply, shed_mode, shedding_enabled
+
 class ChatBotConfig(Document):
-	pass
+	def validate(self):
+		if self.has_value_changed("active_flow_version"):
+			check_flow_version(self.active_flow_version)
+
+		if shedding_enabled(self) and shed_mode(self) == SHED_BUSY_REPLY and not busy_reply(self):
+			frappe.throw(frappe._("Set a Busy Reply, or choose Skip Render Hooks to keep processing messages when overloaded"))
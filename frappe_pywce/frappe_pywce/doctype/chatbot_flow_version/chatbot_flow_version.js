@@ -0,0 +1,16 @@
+// Copyright (c) 2026, donnc and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("ChatBot Flow Version", {
+	refresh(frm) {
+		if (frm.is_new()) return;
+
+		frm.add_custom_button(__("Activate"), () => {
+			frm.call({
+				method: "frappe_pywce.flows.activate_flow",
+				args: { version: frm.doc.name },
+				callback: () => frappe.show_alert(__("Flow version {0} activated", [frm.doc.version])),
+			});
+		});
+	},
+});
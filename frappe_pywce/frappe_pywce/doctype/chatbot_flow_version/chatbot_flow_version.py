@@ -0,0 +1,26 @@
+# Copyright (c) 2026, donnc and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from frappe_pywce.flows import FLOW_VERSION_DOCTYPE, content_hash
+from frappe_pywce.registry import validate_flow_hooks
+
+
+class ChatBotFlowVersion(Document):
+	def before_insert(self):
+		self.content_hash = content_hash(self.flow_json)
+
+		last = frappe.db.get_value(
+			FLOW_VERSION_DOCTYPE,
+			{"bot": self.bot or ["is", "not set"]},
+			"version",
+			order_by="version desc"
+		)
+		self.version = (last or 0) + 1
+
+	def validate(self):
+		# flows moved over by the migration patch were saved before, as they are
+		if self.is_new() and not frappe.flags.in_patch:
+			validate_flow_hooks(self.flow_json)
@@ -0,0 +1,10 @@
+// Copyright (c) 2026, donnc and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("ChatBot Profile", {
+	setup(frm) {
+		frm.set_query("active_flow_version", () => ({
+			filters: { bot: frm.doc.name },
+		}));
+	},
+});
@@ -0,0 +1,25 @@
+# Copyright (c) 2026, donnc and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from frappe_pywce.bots import clear_bot_cache
+from frappe_pywce.flows import check_flow_version
+
+
+class ChatBotProfile(Document):
+	def validate(self):
+		default_phone_id = frappe.db.get_single_value("ChatBot Config", "phone_id")
+
+		if default_phone_id and default_phone_id == self.phone_id:
+			frappe.throw(frappe._("Phone ID {0} is already served by ChatBot Config").format(self.phone_id))
+
+		if self.has_value_changed("active_flow_version"):
+			check_flow_version(self.active_flow_version, self.name)
+
+	def on_update(self):
+		clear_bot_cache()
+
+	def on_trash(self):
+		clear_bot_cache()
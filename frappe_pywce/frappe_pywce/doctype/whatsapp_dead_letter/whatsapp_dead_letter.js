@@ -0,0 +1,8 @@
+// Copyright (c) 2026, donnc and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("WhatsApp Dead Letter", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,33 @@
+// Copyright (c) 2026, donnc and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["WhatsApp Dead Letter"] = {
+  onload: function (listview) {
+    listview.page.add_inner_button(__("Replay Dead Letters"), function () {
+      frappe.prompt(
+        [
+          {
+            fieldname: "concurrency",
+            fieldtype: "Int",
+            label: __("Concurrent Jobs"),
+            default: 4,
+            reqd: 1,
+          },
+        ],
+        function (values) {
+          frappe.call({
+            method: "frappe_pywce.dead_letter.replay_dead_letters",
+            args: values,
+            callback: function (r) {
+              frappe.show_alert(
+                __("Replaying {0} messages in {1} jobs", [r.message.messages, r.message.jobs])
+              );
+            },
+          });
+        },
+        __("Replay Dead Letters"),
+        __("Replay")
+      );
+    });
+  },
+};
@@ -4,6 +4,10 @@
 # import frappe
 from frappe.model.document import Document
 
+from frappe_pywce.sessions import whatsapp_session_name
+
 
 class WhatsAppSession(Document):
-	pass
+	def autoname(self):
+		# one login per user & bot
+		self.name = whatsapp_session_name(self.wa_id, self.bot)
@@ -6,8 +6,9 @@ import frappe.utils
 
 from pywce import EngineResponseException, HookArg, TemplateDynamicBody
 
+from frappe_pywce.bots import current_bot
 from frappe_pywce.util import LOGIN_LINK_EXPIRE_AFTER_IN_MIN
-from frappe_pywce.pywce_logger import app_logger
+from frappe_pywce.pywce_logger import app_logger, report_error
 
 @frappe.whitelist()
 def generate_login_link(arg: HookArg) -> TemplateDynamicBody:
@@ -30,6 +31,7 @@ def generate_login_link(arg: HookArg) -> TemplateDynamicBody:
             "doctype": "WhatsApp Login Token",
             "token": token,
             "wa_id": arg.session_id,
+            "bot": current_bot(),
             "expires_on": expires_on
         })
 
@@ -48,5 +50,5 @@ def generate_login_link(arg: HookArg) -> TemplateDynamicBody:
         return arg
 
     except Exception as e:
-        frappe.log_error(title="Generate Bot LoginLink")
+        report_error(title="Generate Bot LoginLink")
         raise EngineResponseException("Sorry, I couldn't generate a login link right now. Please try again later.")
\ No newline at end of file
@@ -1,8 +1,10 @@
 import frappe
 import frappe.auth
 
+from frappe_pywce.bots import current_bot
+from frappe_pywce.sessions import whatsapp_session_name
 from frappe_pywce.util import  save_whatsapp_session
-from frappe_pywce.pywce_logger import app_logger
+from frappe_pywce.pywce_logger import app_logger, report_error
 from frappe_pywce.managers import FrappeRedisSessionManager
 
 from pywce import SessionConstants
@@ -19,7 +21,7 @@ def login_handler(session_id:str, email:str, password:str) -> tuple:
     """
 
     try:
-        existing = frappe.db.exists("WhatsApp Session", session_id)
+        existing = frappe.db.exists("WhatsApp Session", whatsapp_session_name(session_id, current_bot()))
         if existing:
             return True, "Already logged in"
    
@@ -37,7 +39,7 @@ def login_handler(session_id:str, email:str, password:str) -> tuple:
         return True, "Login successful"
     
     except frappe.AuthenticationError:
-        frappe.log_error(title="[pywce] Login AuthError")
+        report_error(title="[pywce] Login AuthError")
         if frappe.local.response and "message" in frappe.local.response:
             message = frappe.local.response["message"]
         else:
@@ -45,7 +47,7 @@ def login_handler(session_id:str, email:str, password:str) -> tuple:
         return False, message
 
     except Exception as e:
-        frappe.log_error(title="[pywce] Unexpected Login Error")
+        report_error(title="[pywce] Unexpected Login Error")
 
     return False, "Failed to process login, check your details and try again"
 
@@ -55,7 +57,7 @@ def logout_handler(session_id:str):
         login_manager = frappe.auth.LoginManager()
         login_manager.logout(user=usr)
     except Exception as e:
-        frappe.log_error(title="[pywce] Logout")
+        report_error(title="[pywce] Logout")
     finally:
         session_manager.clear(session_id)
         frappe.set_user('Guest')
\ No newline at end of file
@@ -0,0 +1,16 @@
+"""
+gunicorn settings that warm the chatbot engines of each web worker before it takes traffic.
+
+Add them to the bench web process, e.g. in the supervisor or Procfile command:
+
+    gunicorn ... -c python:frappe_pywce.gunicorn_config frappe.app:application
+
+or through the environment: GUNICORN_CMD_ARGS="-c python:frappe_pywce.gunicorn_config".
+"""
+import os
+
+
+def post_worker_init(worker):
+    from frappe_pywce.warmup import warm_sites
+
+    warm_sites(os.environ.get("SITES_PATH", "."))
@@ -1,5 +1,3 @@
-from frappe_pywce.pywce_logger import setup_pywce_logging_for_frappe
-
 app_name = "frappe_pywce"
 app_title = "Frappe Pywce"
 app_publisher = "donnc"
@@ -150,6 +148,25 @@ app_license = "MIT"
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"frappe_pywce.analytics.flush_events",
+			"frappe_pywce.pywce_logger.flush_error_summaries",
+			"frappe_pywce.webhook.consume_ingress_stream"
+		],
+		"*/5 * * * *": [
+			"frappe_pywce.cold_sessions.freeze_idle_sessions"
+		],
+		"*/10 * * * *": [
+			"frappe_pywce.sessions.purge_stale_sessions"
+		],
+		"5 * * * *": [
+			"frappe_pywce.analytics.rollup_stage_counts"
+		],
+	},
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"frappe_pywce.tasks.all"
@@ -204,7 +221,7 @@ app_license = "MIT"
 # Job Events
 # ----------
 # before_job = ["frappe_pywce.utils.before_job"]
-# after_job = ["frappe_pywce.utils.after_job"]
+after_job = ["frappe_pywce.pywce_logger.flush_logs"]
 
 # User Data Protection
 # --------------------
@@ -242,9 +259,9 @@ auth_hooks = [
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
-
+default_log_clearing_doctypes = {
+	"WhatsApp Conversation Event": 30,
+	"WhatsApp Job Profile": 7,
+	"WhatsApp Cold Session": 30
+}
 
-setup_pywce_logging_for_frappe()
\ No newline at end of file
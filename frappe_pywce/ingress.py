@@ -0,0 +1,237 @@
+"""
+Standalone WhatsApp webhook ingress.
+
+A minimal asyncio HTTP server that answers the Meta webhook challenge, verifies
+payload signatures, drops duplicate deliveries and appends payloads to a redis
+stream. Frappe workers drain the stream with `frappe_pywce.webhook.consume_ingress_stream`,
+so inbound capacity is not tied to gunicorn workers.
+
+It does not import frappe, run it next to the bench:
+
+    python -m frappe_pywce.ingress --site mysite.local --redis redis://127.0.0.1:13000 \\
+        --verify-token <webhook token> --app-secret <app secret>
+
+Then point the Meta callback url to it. Every option can also be set from the
+environment, e.g. PYWCE_INGRESS_APP_SECRETS=secret1,secret2 for several bot profiles.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+STREAM_MAX_LEN = 100_000
+DEDUPE_TTL_SEC = 86400
+MAX_BODY_BYTES = 1024 * 1024
+READ_TIMEOUT_SEC = 30
+
+logger = logging.getLogger("frappe_pywce.ingress")
+
+# append a delivery unless it was seen, the dedupe key is only set once the
+# payload is in the stream so a failed append is retried by Meta
+_APPEND_ONCE_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'payload', ARGV[2], 'received_at', ARGV[3])
+redis.call('SET', KEYS[2], 1, 'EX', ARGV[4])
+return 1
+"""
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def stream_key(site: str) -> str:
+    return f"fpw:ingress:{site}"
+
+
+def dedupe_key(site: str, delivery_id: str) -> str:
+    return f"fpw:ingress:{site}:seen:{delivery_id}"
+
+
+def delivery_id(payload: dict) -> Optional[str]:
+    """Id of the first message or status in the payload, Meta retries reuse it"""
+    try:
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+
+                for item in (value.get("messages") or []) + (value.get("statuses") or []):
+                    if item.get("id"):
+                        status = item.get("status")
+                        return f"{item['id']}:{status}" if status else item["id"]
+
+    except AttributeError:
+        pass
+
+    return None
+
+
+def verify_signature(body: bytes, header: Optional[str], secrets: List[str]) -> bool:
+    """Same check as `security.verify_webhook_signature`, against any of the configured app secrets"""
+    if not header:
+        return False
+
+    received = header.split("=", 1)[1] if header.startswith("sha256=") else header
+
+    for secret in secrets:
+        computed = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+        if hmac.compare_digest(computed, received):
+            return True
+
+    return False
+
+
+class IngressServer:
+    def __init__(self, site: str, redis_url: str, verify_tokens: List[str], app_secrets: List[str],
+                 verify_payload: bool = True, stream_max_len: int = STREAM_MAX_LEN):
+        import redis.asyncio
+
+        self.site = site
+        self.redis = redis.asyncio.from_url(redis_url)
+        self.verify_tokens = [t for t in verify_tokens if t]
+        self.app_secrets = [s for s in app_secrets if s]
+        self.verify_payload = verify_payload
+        self.stream = stream_key(site)
+        self.stream_max_len = stream_max_len
+        self._append_once = self.redis.register_script(_APPEND_ONCE_LUA)
+
+    def challenge(self, target: str) -> tuple:
+        params = {k: v[0] for k, v in parse_qs(urlsplit(target).query).items()}
+
+        if params.get("hub.mode") == "subscribe" and params.get("hub.verify_token") in self.verify_tokens:
+            return 200, params.get("hub.challenge", "").encode("utf-8")
+
+        return 403, b"Forbidden"
+
+    async def accept(self, body: bytes, headers: dict) -> tuple:
+        if self.verify_payload:
+            signature = headers.get("x-hub-signature-256") or headers.get("x-hub-signature")
+
+            if not verify_signature(body, signature, self.app_secrets):
+                return 403, b"Forbidden"
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, b"Invalid webhook data"
+
+        did = delivery_id(payload)
+
+        try:
+            if did:
+                await self._append_once(
+                    keys=[self.stream, dedupe_key(self.site, did)],
+                    args=[self.stream_max_len, body, time.time(), DEDUPE_TTL_SEC]
+                )
+
+            else:
+                await self.redis.xadd(
+                    self.stream, {"payload": body, "received_at": time.time()},
+                    maxlen=self.stream_max_len, approximate=True
+                )
+
+        except Exception:
+            logger.exception("Failed to enqueue webhook payload")
+            # let Meta retry the delivery
+            return 503, b"Service Unavailable"
+
+        return 200, b"OK"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT_SEC)
+
+                if not request_line:
+                    break
+
+                method, target, version = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT_SEC)
+
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, b"Payload Too Large", keep_alive=False)
+                    break
+
+                body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT_SEC) if length else b""
+
+                if method == "GET":
+                    status, content = self.challenge(target)
+                elif method == "POST":
+                    status, content = await self.accept(body, headers)
+                else:
+                    status, content = 405, b"Method Not Allowed"
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+                await self.respond(writer, status, content, keep_alive)
+
+                if not keep_alive:
+                    break
+
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, content: bytes, keep_alive: bool = True):
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: text/plain\r\nContent-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + content)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("pywce ingress for %s listening on %s:%s", self.site, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+
+def _env_list(name: str) -> List[str]:
+    return [v.strip() for v in os.environ.get(name, "").split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pywce webhook ingress")
+    parser.add_argument("--site", default=os.environ.get("PYWCE_INGRESS_SITE"), required="PYWCE_INGRESS_SITE" not in os.environ)
+    parser.add_argument("--redis", default=os.environ.get("PYWCE_INGRESS_REDIS", "redis://127.0.0.1:13000"), help="bench redis_cache url")
+    parser.add_argument("--host", default=os.environ.get("PYWCE_INGRESS_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PYWCE_INGRESS_PORT", 8085)))
+    parser.add_argument("--verify-token", action="append", default=_env_list("PYWCE_INGRESS_VERIFY_TOKENS"))
+    parser.add_argument("--app-secret", action="append", default=_env_list("PYWCE_INGRESS_APP_SECRETS"))
+    parser.add_argument("--no-verify-payload", action="store_true", help="skip signature checks, local emulator only")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if not args.no_verify_payload and not args.app_secret:
+        parser.error("--app-secret is required unless --no-verify-payload is set")
+
+    server = IngressServer(args.site, args.redis, args.verify_token, args.app_secret, verify_payload=not args.no_verify_payload)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
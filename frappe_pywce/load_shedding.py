@@ -0,0 +1,99 @@
+import datetime
+import time
+from typing import Dict, Optional, Tuple
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+SHED_BUSY_REPLY = "Busy Reply"
+SHED_SKIP_HOOKS = "Skip Render Hooks"
+
+DEFAULT_MAX_QUEUE_DEPTH = 500
+DEFAULT_MAX_JOB_AGE_SEC = 30
+BUSY_REPLY_WINDOW_SEC = 60
+
+# per-process queue pressure: queue -> (checked at, depth, oldest job age).
+# re-read at most every PRESSURE_CHECK_INTERVAL_SEC, not on every webhook
+PRESSURE_CHECK_INTERVAL_SEC = 2
+_PRESSURE: Dict[str, Tuple[float, int, float]] = {}
+
+
+def shedding_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("shed_load")))
+
+
+def shed_mode(settings) -> str:
+    return settings.get("shed_mode") or SHED_BUSY_REPLY
+
+
+def busy_reply(settings) -> Optional[str]:
+    return (settings.get("busy_reply") or "").strip() or None
+
+
+def _read_pressure(queue: str) -> Tuple[int, float]:
+    from frappe.utils.background_jobs import get_queue
+
+    q = get_queue(queue)
+    depth = q.count
+    age = 0.0
+
+    if depth:
+        oldest = q.get_job_ids(0, 1)
+        job = q.fetch_job(oldest[0]) if oldest else None
+
+        if job is not None and job.enqueued_at:
+            # rq stores naive utc datetimes, newer versions aware ones
+            enqueued_at = job.enqueued_at
+
+            if enqueued_at.tzinfo is None:
+                enqueued_at = enqueued_at.replace(tzinfo=datetime.timezone.utc)
+
+            age = (datetime.datetime.now(datetime.timezone.utc) - enqueued_at).total_seconds()
+
+    return depth, age
+
+
+def queue_pressure(queue: str) -> Tuple[int, float]:
+    """(pending jobs, age in seconds of the oldest one) of an RQ queue"""
+    now = time.monotonic()
+    cached = _PRESSURE.get(queue)
+
+    if cached is not None and now - cached[0] < PRESSURE_CHECK_INTERVAL_SEC:
+        return cached[1], cached[2]
+
+    try:
+        depth, age = _read_pressure(queue)
+    except Exception:
+        # unknown queue or redis hiccup, never shed on a failed check
+        logger.debug("Failed to read pressure of queue %s", queue, exc_info=True)
+        depth, age = 0, 0.0
+
+    _PRESSURE[queue] = (now, depth, age)
+    return depth, age
+
+
+def overloaded(settings, queue: str) -> bool:
+    """Whether the queue is past the configured depth or oldest job age"""
+    max_depth = frappe.utils.cint(settings.get("shed_queue_depth")) or DEFAULT_MAX_QUEUE_DEPTH
+    max_age = frappe.utils.cint(settings.get("shed_job_age_sec")) or DEFAULT_MAX_JOB_AGE_SEC
+    depth, age = queue_pressure(queue)
+
+    return depth >= max_depth or age >= max_age
+
+
+def claim_busy_reply(wa_id: str, bot: str = None) -> bool:
+    """True once per user per BUSY_REPLY_WINDOW_SEC, so a busy user is not spammed"""
+    key = frappe.cache.make_key(create_cache_key(f"busy:{bot}:{wa_id}" if bot else f"busy:{wa_id}"))
+    return bool(frappe.cache.set(key, 1, nx=True, ex=BUSY_REPLY_WINDOW_SEC))
+
+
+def is_degraded() -> bool:
+    """Whether the current job was enqueued under overload"""
+    return getattr(frappe.local, "pywce_degraded", False)
+
+
+def set_degraded(degraded: bool) -> None:
+    frappe.local.pywce_degraded = degraded
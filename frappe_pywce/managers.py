@@ -1,18 +1,68 @@
+import hashlib
 import json
+import time
 from typing import Dict, Any, List, Optional, Type, TypeVar
 
 import frappe
+import redis.exceptions
+
+from pywce import EngineConstants, ISessionManager, SessionConstants, VisualTranslator, storage, template
+
+from frappe_pywce.analytics import capture_event, count_stage_change
+from frappe_pywce.bots import current_bot
+from frappe_pywce.cold_sessions import cold_tier_enabled, drop_cold_session, thaw_session, touch_session
+from frappe_pywce.pywce_logger import app_logger as logger, report_error
+from frappe_pywce.registry import flow_hook_paths, register_hooks
+from frappe_pywce.serializers import SessionSerializer
+from frappe_pywce.session_budget import SessionBudget, record_session_size
+from frappe_pywce.sessions import (
+    SESSION_TTL_SEC,
+    bump_session_generation,
+    create_cache_key,
+    namespaced_cache_key,
+    session_generation
+)
 
-from pywce import ISessionManager, VisualTranslator, storage, template
+T = TypeVar("T")
 
-from frappe_pywce.pywce_logger import app_logger as logger
+# per-process translation caches: node content hash -> translated node,
+# flow content hash -> fully assembled flow state. One flow per bot profile
+# is active, the least recently used flows beyond FLOW_CACHE_SIZE are dropped
+FLOW_CACHE_SIZE = 16
+_NODE_CACHE: Dict[str, Dict[str, Any]] = {}
+_FLOW_CACHE: Dict[str, Dict[str, Any]] = {}
 
-T = TypeVar("T")
+# per-process read cache of the global session store by (site, bot namespace).
+# its redis version counter is checked once per request / job, the data itself
+# is only read again after another process changed it
+_GLOBAL_CACHE: Dict[tuple, Dict[str, Any]] = {}
+
+def flow_hash(flow_json) -> str:
+    return hashlib.sha256(str(flow_json).encode("utf-8")).hexdigest()
+
+def node_hash(tpl: dict, id_map: dict) -> str:
+    """Hash a studio node by everything its translation depends on.
+
+    Canvas position is ignored, route targets are resolved to names so
+    renaming a connected node invalidates its parents too.
+    """
+    content = {k: v for k, v in tpl.items() if k != "position"}
+    targets = [id_map.get(r.get("connectedTo")) for r in tpl.get("routes", []) or []]
+    raw = json.dumps([content, targets], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _cache_flow(key: str, state: Dict[str, Any]) -> None:
+    _FLOW_CACHE[key] = state
 
-CACHE_KEY_PREFIX = "fpw:"
+    while len(_FLOW_CACHE) > FLOW_CACHE_SIZE:
+        _FLOW_CACHE.pop(next(iter(_FLOW_CACHE)))
 
-def create_cache_key(k:str):
-    return f'{CACHE_KEY_PREFIX}{k}'
+    # drop nodes that are no longer part of any cached flow
+    live_nodes = set().union(*(flow["node_keys"] for flow in _FLOW_CACHE.values()))
+
+    for node_key in list(_NODE_CACHE.keys()):
+        if node_key not in live_nodes:
+            _NODE_CACHE.pop(node_key, None)
 
 class FrappeStorageManager(storage.IStorageManager):
     """
@@ -22,9 +72,15 @@ class FrappeStorageManager(storage.IStorageManager):
     1. Fetching the "active" chatbot flow.
     2. Caching the *translated* pywce-compatible dictionary.
     3. Invalidating the cache when the bot is saved in Frappe.
+    4. Validating each template model once per flow version.
+
+    Translation is incremental: each studio node is cached by content hash,
+    so a flow edit only re-translates the nodes that changed. The new flow
+    state is assembled aside and swapped in at once.
     """
     _TEMPLATES: Dict = {}
-    _TRIGGERS: List[template.EngineRoute] = {}
+    _MODELS: Dict[str, template.EngineTemplate] = {}
+    _TRIGGERS: List[template.EngineRoute] = []
 
     START_MENU: Optional[str] = None
     REPORT_MENU: Optional[str] = None
@@ -32,22 +88,102 @@ class FrappeStorageManager(storage.IStorageManager):
     def __init__(self, flow_json):
         self.flow_json = flow_json
         self._ensure_templates_loaded()
-    
-    # might add caching
+
+    def _translate_node(self, tpl: dict, id_map: dict) -> Dict[str, Any]:
+        name = tpl.get("name")
+        settings = tpl.get("settings", {}) or {}
+        trigger = None
+
+        trigger_pattern = settings.get("trigger")
+
+        if trigger_pattern:
+            if not trigger_pattern.startswith(EngineConstants.REGEX_PLACEHOLDER):
+                trigger_pattern = f"{EngineConstants.REGEX_PLACEHOLDER}{trigger_pattern}"
+
+            trigger = template.EngineRoute(user_input=trigger_pattern, next_stage=name, is_regex=True)
+
+        translated = VisualTranslator()._transform_template(tpl, id_map)
+
+        return {
+            "name": name,
+            "template": translated,
+            "trigger": trigger,
+            "is_start": settings.get("isStart", False),
+            "is_report": settings.get("isReport", False)
+        }
+
+    def _translate_flow(self) -> Dict[str, Any]:
+        data = json.loads(self.flow_json) if isinstance(self.flow_json, str) else self.flow_json
+        templates_list = data.get("templates", []) or []
+
+        id_to_name_map = {
+            tpl.get("id"): tpl.get("name")
+            for tpl in templates_list
+            if tpl.get("id") and tpl.get("name")
+        }
+
+        state = {"templates": {}, "models": {}, "triggers": [], "start": None, "report": None}
+        live_nodes = set()
+        changed = 0
+
+        for tpl in templates_list:
+            if not tpl.get("name"):
+                continue
+
+            key = node_hash(tpl, id_to_name_map)
+            node = _NODE_CACHE.get(key)
+
+            if node is None:
+                node = _NODE_CACHE[key] = self._translate_node(tpl, id_to_name_map)
+                changed += 1
+
+            live_nodes.add(key)
+
+            state["templates"][node["name"]] = node["template"]
+
+            if node["trigger"] is not None:
+                state["triggers"].append(node["trigger"])
+
+            if node["is_report"]:
+                state["report"] = node["name"]
+
+            if node["is_start"]:
+                state["start"] = node["name"]
+
+        state["node_keys"] = live_nodes
+
+        # resolve hooks once per flow version instead of on every call
+        register_hooks(flow_hook_paths(data))
+
+        logger.debug("Flow translated, templates: %s, re-translated nodes: %s", len(state["templates"]), changed)
+
+        return state
+
     def _load_templates_from_db(self):
-        # TODO: May load direct from DocType field instead of re-fetching
         try:
             if not self.flow_json:
                 raise Exception(f"No flow json found or is empty.")
-            
-            ui_translator = VisualTranslator()
-            self._TEMPLATES, self._TRIGGERS = ui_translator.translate(self.flow_json)
-            self.START_MENU = ui_translator.START_MENU
-            self.REPORT_MENU = ui_translator.REPORT_MENU
+
+            key = flow_hash(self.flow_json)
+            state = _FLOW_CACHE.get(key)
+
+            if state is None:
+                state = self._translate_flow()
+                _cache_flow(key, state)
+            else:
+                # most recently used flows are kept
+                _FLOW_CACHE[key] = _FLOW_CACHE.pop(key)
+
+            self._TEMPLATES = state["templates"]
+            self._MODELS = state["models"]
+            self._TRIGGERS = state["triggers"]
+            self.START_MENU = state["start"]
+            self.REPORT_MENU = state["report"]
 
         except Exception as e:
-            frappe.log_error(title=f"FrappeStorageManager Load Error")
+            report_error(title=f"FrappeStorageManager Load Error")
             self._TEMPLATES = {}
+            self._MODELS = {}
 
     def _ensure_templates_loaded(self):
         """
@@ -67,19 +203,30 @@ class FrappeStorageManager(storage.IStorageManager):
         self._ensure_templates_loaded()
         return name in self._TEMPLATES
 
-    def get(self, name: str) -> template.EngineTemplate:    
+    def get(self, name: str) -> template.EngineTemplate:
+        """Template model of a stage, validated on first use per flow version"""
         try:
             self._ensure_templates_loaded()
-            template_data = self._TEMPLATES.get(name)
-            return template.Template.as_model(template_data)
+            model = self._MODELS.get(name)
+
+            if model is None:
+                model = self._MODELS[name] = template.Template.as_model(self._TEMPLATES.get(name))
+
+            # each send gets its own copy, far cheaper than validating the dict again
+            return model.model_copy(deep=True)
         except Exception:
-            frappe.log_error(title="Get Template Error")
+            report_error(title="Get Template Error")
             logger.critical("Error fetching template: %s", name, exc_info=True)
             return None
 
     def triggers(self) -> List[template.EngineRoute]:
         return self._TRIGGERS
-    
+
+    def templates(self) -> Dict[str, Any]:
+        """Translated templates by stage name"""
+        self._ensure_templates_loaded()
+        return self._TEMPLATES
+
     def __repr__(self):
         return f"FrappeStorageManager(start_menu={self.START_MENU}, report_menu={self.REPORT_MENU}, \
             templates_count={len(self._TEMPLATES.keys())}, triggers_count={len(self._TRIGGERS)})"
@@ -91,21 +238,192 @@ class FrappeRedisSessionManager(ISessionManager):
     
     Uses Frappe's Redis cache to store user session data.
 
-    user data has default expiry set to 10 mins
-    global data has default expiry set to 30 mins
+    user data has default expiry set to 30 mins
+    global data has default expiry set to 1 day
+
+    Global data is served from a per-process read cache. A redis version counter,
+    bumped on every global write, is checked once per request / job and the data
+    is only read again when it changed.
+
+    All keys are namespaced by the session generation, see `clear_all`,
+    and by bot profile so a user chatting to several bots keeps separate sessions.
+
+    With cold sessions enabled in `ChatBot Config`, idle user sessions are moved
+    to the database and rehydrated into redis on the user's next message,
+    see `frappe_pywce.cold_sessions`.
     """
     _global_expiry = 86400
     _global_key_ = create_cache_key("global")
 
-    def __init__(self, ttl=1800):
+    def __init__(self, ttl=SESSION_TTL_SEC, serializer: Optional[SessionSerializer] = None, budget: Optional[SessionBudget] = None,
+                 namespace: Optional[str] = None):
         """Initialize session manager with default expiry time.
         TODO: take the configured ttl in app settings
+
+        Args:
+            serializer: session blob encoder, defaults to the one configured in `ChatBot Config`
+            budget: per user session byte / key limits, defaults to the one configured in `ChatBot Config`
+            namespace: bot profile the sessions belong to, defaults to the bot of the webhook being processed
         """
         self.ttl = ttl
+        self.namespace = namespace
+        self._serializer = serializer
+        self._budget = budget
+
+    @property
+    def serializer(self) -> SessionSerializer:
+        if self._serializer is None:
+            self._serializer = SessionSerializer.from_settings(frappe.get_cached_doc("ChatBot Config"))
+
+        return self._serializer
+
+    @property
+    def budget(self) -> SessionBudget:
+        if self._budget is None:
+            self._budget = SessionBudget.from_settings(frappe.get_cached_doc("ChatBot Config"))
+
+        return self._budget
+
+    @property
+    def cold_tier(self) -> bool:
+        return cold_tier_enabled(frappe.get_cached_doc("ChatBot Config"))
+
+    def _write_session(self, session_id: str, data: dict) -> None:
+        """Write a user session within its budget, recording its size"""
+        payload, stats = self.budget.enforce(data, self.serializer.dumps, prop_key=self.prop_key)
+
+        if stats["history"] or stats["keys"]:
+            logger.info("Session %s over budget, evicted %s history entries and %s keys", session_id, stats["history"], stats["keys"])
+
+        key = frappe.cache.make_key(self._get_prefixed_key(session_id))
+        pipe = frappe.cache.pipeline()
+
+        if self.cold_tier:
+            touch_session(pipe, key)
+
+        pipe.set(key, payload, ex=self.ttl)
+
+        try:
+            record_session_size(pipe, len(payload), len(data), stats)
+        except Exception:
+            logger.debug("Failed to record session size", exc_info=True)
+
+        pipe.execute()
+
+    def _write(self, key: str, data: dict, ttl: int) -> None:
+        frappe.cache.set(frappe.cache.make_key(key), self.serializer.dumps(data), ex=ttl)
+
+    def _read(self, key: str) -> Optional[dict]:
+        return self.serializer.loads(frappe.cache.get(frappe.cache.make_key(key)))
+
+    def _read_session(self, session_id: str) -> Optional[dict]:
+        key = frappe.cache.make_key(self._get_prefixed_key(session_id))
+        raw = frappe.cache.get(key)
+
+        if raw is None and not self._namespace:
+            raw = self._adopt_legacy_session(session_id, key)
+
+        if raw is None and self.cold_tier:
+            raw = thaw_session(key, self.ttl)
+
+        return self.serializer.loads(raw)
+
+    def _adopt_legacy_session(self, session_id: str, key: str) -> Optional[bytes]:
+        """
+        Move a session written before generation namespaces, `fpw:<wa_id>`, to its current key.
+
+        Kept for one release so upgrading does not reset live conversations,
+        the serializer still reads the old pickled json value.
+        """
+        legacy = frappe.cache.make_key(create_cache_key(session_id))
+
+        try:
+            # keeps the ttl, never overwrites a session written since
+            if not frappe.cache.renamenx(legacy, key):
+                return None
+
+        except redis.exceptions.ResponseError:
+            # no legacy session
+            return None
+
+        return frappe.cache.get(key)
+
+    @property
+    def _namespace(self) -> Optional[str]:
+        """Bot profile the sessions belong to, resolved per call for shared instances"""
+        return self.namespace or current_bot()
+
+    def _global_version_key(self) -> str:
+        """Raw (site-prefixed) redis key of the global store's version counter"""
+        namespace = self._namespace
+        return frappe.cache.make_key(create_cache_key(f"global:version:{namespace}" if namespace else "global:version"))
+
+    def _global_cache_entry(self) -> Dict[str, Any]:
+        site = getattr(frappe.local, "site", None) or ""
+
+        return _GLOBAL_CACHE.setdefault((site, self._namespace or ""), {
+            "data": None, "version": None, "generation": None, "fetched_at": 0.0
+        })
+
+    def _global_checked(self) -> set:
+        """Bot namespaces whose global version was checked in this request / job"""
+        checked = getattr(frappe.local, "pywce_global_checked", None)
+
+        if checked is None:
+            checked = frappe.local.pywce_global_checked = set()
+
+        return checked
+
+    def _global_changed(self, session_data: Optional[dict]) -> None:
+        entry = self._global_cache_entry()
+
+        entry["data"] = session_data
+        entry["version"] = int(frappe.cache.incr(self._global_version_key()))
+        entry["generation"] = session_generation()
+        entry["fetched_at"] = time.monotonic()
+
+        self._global_checked().add(self._namespace or "")
+
+    def _get_global_data(self) -> dict:
+        entry = self._global_cache_entry()
+        generation = session_generation()
+        checked = self._global_checked()
+        namespace = self._namespace or ""
+        now = time.monotonic()
+
+        fresh = entry["data"] is not None and entry["generation"] == generation and now - entry["fetched_at"] < self._global_expiry
+
+        if fresh and namespace in checked:
+            return dict(entry["data"])
+
+        version_key = self._global_version_key()
+
+        if fresh:
+            version = int(frappe.cache.get(version_key) or 0)
+
+            if version != entry["version"]:
+                fresh = False
+
+        if not fresh:
+            # version & data in one round trip, the version is bumped after the data is written
+            pipe = frappe.cache.pipeline()
+            pipe.get(version_key)
+            pipe.get(frappe.cache.make_key(self._get_prefixed_key(self._global_key_)))
+            version, raw = pipe.execute()
+
+            entry["data"] = self.serializer.loads(raw) or {}
+            entry["generation"] = generation
+            entry["fetched_at"] = now
+
+        entry["version"] = int(version or 0)
+        checked.add(namespace)
+
+        return dict(entry["data"])
 
     def _get_prefixed_key(self, session_id, key=None):
-        """Helper to create prefixed cache keys."""
-        k = create_cache_key(session_id)
+        """Helper to create prefixed cache keys in the current session generation & bot namespace."""
+        namespace = self._namespace
+        k = namespaced_cache_key(f"{namespace}:{session_id}" if namespace else session_id)
 
         if key is None:
             return k
@@ -119,32 +437,17 @@ class FrappeRedisSessionManager(ISessionManager):
         if session_data is None: return
         
         if is_global:
-            frappe.cache.set_value(
-                key=self._get_prefixed_key(self._global_key_), 
-                val=json.dumps(session_data), 
-                expires_in_sec=self._global_expiry
-            )
+            self._write(self._get_prefixed_key(self._global_key_), session_data, self._global_expiry)
+            self._global_changed(session_data)
             
         else:
-            frappe.cache.set_value(
-                key=self._get_prefixed_key(session_id), 
-                val=json.dumps(session_data), 
-                expires_in_sec=self.ttl
-        )
+            self._write_session(session_id, session_data)
 
     def _get_data(self, session_id:str=None, is_global=False) -> dict:
-        raw = frappe.cache.get_value(
-            key=self._get_prefixed_key(self._global_expiry), 
-            expires=True
-        ) if is_global else frappe.cache.get_value(
-            key=self._get_prefixed_key(session_id), 
-            expires=True
-        )
-
-        if raw is None:
-            return {}
-        
-        return json.loads(raw)
+        if is_global:
+            return self._get_global_data()
+
+        return self._read_session(session_id) or {}
 
     @property
     def prop_key(self) -> str:
@@ -157,6 +460,13 @@ class FrappeRedisSessionManager(ISessionManager):
     def save(self, session_id: str, key: str, data: Any) -> None:
         """Save a key-value pair into the session."""
         d = self._get_data(session_id=session_id)
+
+        if key == SessionConstants.CURRENT_STAGE and d.get(key) != data:
+            capture_event("stage", wa_id=session_id, from_stage=d.get(key), to_stage=data)
+            count_stage_change(d.get(key), data, self._namespace)
+
+        # keep keys in write order, budget eviction drops the least recently written first
+        d.pop(key, None)
         d[key] = data
         self._set_data(session_id=session_id, session_data=d)
 
@@ -206,20 +516,29 @@ class FrappeRedisSessionManager(ISessionManager):
         """Clear the entire session.
         """
         if retain_keys is None or retain_keys == []:
-            frappe.cache().delete_keys(self._get_prefixed_key(session_id))
+            key = frappe.cache.make_key(self._get_prefixed_key(session_id))
+            frappe.cache.delete(key)
+
+            if self.cold_tier:
+                drop_cold_session(key)
+
             return
-        
-        for retain_key in retain_keys:
-            data = self.fetch_all(session_id)
-            for k, v in data.items():
-                if retain_key in k:
-                    continue
 
-                self.evict(session_id, k)
+        data = self.fetch_all(session_id)
+        retained = {k: v for k, v in data.items() if any(retain_key in k for retain_key in retain_keys)}
+
+        if len(retained) != len(data):
+            self._set_data(session_id=session_id, session_data=retained)
 
     def clear_global(self) -> None:
         """Clear all global data."""
-        frappe.cache().delete_keys(self._get_prefixed_key(self._global_key_))
+        frappe.cache.delete(frappe.cache.make_key(self._get_prefixed_key(self._global_key_)))
+        self._global_changed({})
+
+    def clear_all(self) -> None:
+        """Invalidate every user & global session by starting a new session generation."""
+        bump_session_generation()
+        self._global_changed({})
 
     def key_in_session(self, session_id: str, key: str, check_global: bool = True) -> bool:
         """Check if a key exists in session or global storage."""
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import mimetypes
+import os
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import frappe
+import frappe.utils
+
+if TYPE_CHECKING:
+    from pywce import client
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+MEDIA_DOCTYPE = "WhatsApp Media"
+MEDIA_TYPES = ("image", "document", "video", "audio", "sticker")
+
+DEFAULT_MAX_SIZE_MB = 64
+DEFAULT_MEDIA_QUEUE = "long"
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT_SEC = 120
+
+# a user's messages are held in a redis list while their media downloads,
+# the media job enqueues them in order. Expires if the media job never runs
+HOLD_TTL_SEC = 3600
+
+# hold a message: returns -1 when nothing is held and the message has no media,
+# 0 when it starts a hold & the caller enqueues the media job, else the messages held before it
+_HOLD_LUA = """
+local held = redis.call('LLEN', KEYS[1])
+
+if held == 0 and ARGV[2] == '0' then
+    return -1
+end
+
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return held
+"""
+
+# drop the released head of the hold, returns the messages left
+_RELEASE_LUA = """
+redis.call('LPOP', KEYS[1])
+return redis.call('LLEN', KEYS[1])
+"""
+
+_script = {}
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def media_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("media_pipeline")))
+
+
+def media_queue(settings) -> str:
+    return settings.get("media_queue") or DEFAULT_MEDIA_QUEUE
+
+
+def max_media_bytes(settings) -> int:
+    size_mb = settings.get("media_max_size_mb")
+    return (DEFAULT_MAX_SIZE_MB if size_mb is None else frappe.utils.cint(size_mb)) * 1024 * 1024
+
+
+def _lua(name: str, source: str):
+    if name not in _script:
+        _script[name] = frappe.cache.register_script(source)
+
+    return _script[name]
+
+
+def hold_key(wa_id: str, bot: str = None) -> str:
+    return frappe.cache.make_key(create_cache_key(f"media_hold:{bot}:{wa_id}" if bot else f"media_hold:{wa_id}"))
+
+
+def hold_message(key: str, job: Dict[str, Any], has_media: bool) -> int:
+    """
+    Queue a conversation job behind the user's pending media downloads.
+
+    Returns -1 when the job is not held and can be enqueued, 0 when it opens
+    a hold and a media job must be started, else the count of jobs held before it.
+    """
+    return int(_lua("hold", _HOLD_LUA)(keys=[key], args=[json.dumps(job), int(has_media), HOLD_TTL_SEC], client=frappe.cache))
+
+
+def next_held(key: str) -> Optional[Dict[str, Any]]:
+    """Oldest held job, it stays held until `release_held`"""
+    raw = frappe.cache.pipeline().lindex(key, 0).execute()[0]
+    return json.loads(raw) if raw else None
+
+
+def release_held(key: str) -> int:
+    """Drop the oldest held job once it is enqueued, returns the jobs left. The hold ends at 0"""
+    return int(_lua("release", _RELEASE_LUA)(keys=[key], client=frappe.cache))
+
+
+def find_media(payload: dict) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(media type, media object) of the first inbound media message in the payload"""
+    try:
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                for message in (change.get("value") or {}).get("messages") or []:
+                    typ = message.get("type")
+
+                    if typ in MEDIA_TYPES and isinstance(message.get(typ), dict) and message[typ].get("id"):
+                        return typ, message[typ]
+
+    except AttributeError:
+        pass
+
+    return None
+
+
+def _extension(media: Dict[str, Any]) -> str:
+    filename = media.get("filename") or ""
+    ext = os.path.splitext(filename)[1]
+
+    if not ext:
+        mime = (media.get("mime_type") or "").split(";")[0].strip()
+        ext = mimetypes.guess_extension(mime) or ""
+
+    return ext.lower()
+
+
+def _existing_file(sha256: str = None, meta_sha256: str = None) -> Optional[str]:
+    if sha256:
+        return frappe.db.get_value(MEDIA_DOCTYPE, sha256, "file")
+
+    if meta_sha256:
+        return frappe.db.get_value(MEDIA_DOCTYPE, {"meta_sha256": meta_sha256}, "file")
+
+    return None
+
+
+def _stream_to_disk(wa: "client.WhatsApp", media_url: str, folder: str, max_bytes: int) -> Tuple[str, str, int]:
+    """Download in chunks to a temp file, hashing as we go. Returns (temp path, sha256, size)"""
+    import httpx
+
+    tmp_path = os.path.join(folder, f".pywce-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with httpx.Client(timeout=DOWNLOAD_TIMEOUT_SEC) as http:
+            with http.stream("GET", media_url, headers={"Authorization": wa.headers["Authorization"]}) as response:
+                response.raise_for_status()
+
+                if frappe.utils.cint(response.headers.get("content-length")) > max_bytes:
+                    raise MediaTooLarge(f"Media is larger than {max_bytes} bytes")
+
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+
+                        if size > max_bytes:
+                            raise MediaTooLarge(f"Media is larger than {max_bytes} bytes")
+
+                        digest.update(chunk)
+                        f.write(chunk)
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return tmp_path, digest.hexdigest(), size
+
+
+def save_media(wa: "client.WhatsApp", media_type: str, media: Dict[str, Any], wa_id: str = None, max_bytes: int = None) -> str:
+    """
+    Store inbound WhatsApp media as a private `File`, streamed to disk in chunks.
+
+    Media is deduplicated by SHA-256: the checksum Meta sends is checked before
+    downloading, the computed one before creating a new File.
+
+    Returns:
+        name of the File doc
+    """
+    max_bytes = max_bytes or DEFAULT_MAX_SIZE_MB * 1024 * 1024
+    meta_sha256 = media.get("sha256")
+
+    existing = _existing_file(meta_sha256=meta_sha256)
+
+    if existing:
+        return existing
+
+    media_url = wa.util.query_media_url(media["id"])
+
+    if not media_url:
+        raise frappe.ValidationError(f"Could not resolve media url for {media['id']}")
+
+    folder = frappe.get_site_path("private", "files")
+    os.makedirs(folder, exist_ok=True)
+
+    tmp_path, sha256, size = _stream_to_disk(wa, media_url, folder, max_bytes)
+
+    existing = _existing_file(sha256=sha256)
+
+    if existing:
+        os.remove(tmp_path)
+        return existing
+
+    file_name = f"wa-{sha256[:24]}{_extension(media)}"
+    os.replace(tmp_path, os.path.join(folder, file_name))
+
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": media.get("filename") or file_name,
+        "file_url": f"/private/files/{file_name}",
+        "is_private": 1,
+        "file_size": size
+    }).insert(ignore_permissions=True)
+
+    frappe.get_doc({
+        "doctype": MEDIA_DOCTYPE,
+        "sha256": sha256,
+        "meta_sha256": meta_sha256,
+        "file": file_doc.name,
+        "media_type": media_type,
+        "mime_type": media.get("mime_type"),
+        "file_size": size,
+        "wa_id": wa_id
+    }).insert(ignore_permissions=True, ignore_if_duplicate=True)
+
+    logger.debug("Saved %s media %s as %s (%s bytes)", media_type, media["id"], file_doc.name, size)
+
+    return file_doc.name
+
+
+def attach_media(payload: dict, wa: "client.WhatsApp", max_bytes: int, wa_id: str = None) -> dict:
+    """
+    Download the payload media and reference the stored File in it.
+
+    The media object gains `file` & `file_url`, or `file_error` on failure, and
+    reaches hooks unchanged as `HookArg.additional_data`.
+    """
+    found = find_media(payload)
+
+    if found is None:
+        return payload
+
+    media_type, media = found
+
+    try:
+        file_name = save_media(wa, media_type, media, wa_id=wa_id, max_bytes=max_bytes)
+        media["file"] = file_name
+        media["file_url"] = frappe.db.get_value("File", file_name, "file_url")
+
+    except MediaTooLarge as e:
+        media["file_error"] = str(e)
+
+    except Exception:
+        logger.error("Failed to save inbound %s media %s", media_type, media.get("id"), exc_info=True)
+        media["file_error"] = "Failed to download media"
+
+    return payload
@@ -0,0 +1,21 @@
+import frappe
+
+from frappe_pywce.flows import save_flow_version
+
+
+def execute():
+    """Store the flow_json of `ChatBot Config` & `ChatBot Profile` as their first flow version"""
+    flow_json = frappe.db.get_value("Singles", {"doctype": "ChatBot Config", "field": "flow_json"}, "value")
+
+    if flow_json and not frappe.db.get_single_value("ChatBot Config", "active_flow_version"):
+        frappe.db.set_single_value("ChatBot Config", "active_flow_version", save_flow_version(flow_json))
+
+    frappe.db.delete("Singles", {"doctype": "ChatBot Config", "field": "flow_json"})
+
+    if not frappe.db.has_column("ChatBot Profile", "flow_json"):
+        return
+
+    for profile in frappe.db.sql("select name, flow_json from `tabChatBot Profile` where ifnull(flow_json, '') != ''", as_dict=True):
+        if not frappe.db.get_value("ChatBot Profile", profile.name, "active_flow_version"):
+            frappe.db.set_value("ChatBot Profile", profile.name, "active_flow_version",
+                                save_flow_version(profile.flow_json, profile.name), update_modified=False)
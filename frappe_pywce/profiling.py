@@ -0,0 +1,150 @@
+import collections
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+
+PROFILE_DOCTYPE = "WhatsApp Job Profile"
+
+DEFAULT_SAMPLE_RATE = 0.05
+DEFAULT_SLOW_MS = 2000
+DEFAULT_TOP_N = 25
+SAMPLE_INTERVAL_SEC = 0.005
+MAX_STACK_DEPTH = 64
+
+
+def _short_path(filename: str) -> str:
+    return os.sep.join(filename.split(os.sep)[-2:])
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of a single thread.
+
+    A daemon thread reads the profiled thread's current frame every `interval`
+    seconds and counts the call stacks it finds. Overhead depends on the
+    interval only, not on the number of calls made like cProfile.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SEC, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._sample, name="pywce-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def top_stacks(self, n: int = DEFAULT_TOP_N) -> List[Tuple[str, int]]:
+        """Most sampled stacks, root first, in flamegraph folded format"""
+        return self.stacks.most_common(n)
+
+    def top_functions(self, n: int = DEFAULT_TOP_N) -> List[Tuple[str, int]]:
+        """Functions by self samples, i.e. where the thread actually was"""
+        leaves = collections.Counter()
+
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+
+        return leaves.most_common(n)
+
+
+def profiling_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("profile_jobs")))
+
+
+def _sampled(settings) -> bool:
+    rate = settings.get("profile_sample_rate")
+    rate = DEFAULT_SAMPLE_RATE if rate is None else frappe.utils.flt(rate)
+    return random.random() < rate
+
+
+def _format(rows: List[Tuple[str, int]], samples: int) -> str:
+    return "\n".join(f"{count} ({count * 100 / samples:.1f}%) {row}" for row, count in rows)
+
+
+def save_profile(profiler: SamplingProfiler, duration_ms: float, top_n: int = DEFAULT_TOP_N, **data) -> Optional[str]:
+    """Store the top stacks of a slow job, returns the profile name"""
+    if not profiler.samples:
+        return None
+
+    doc = frappe.get_doc({
+        "doctype": PROFILE_DOCTYPE,
+        "wa_id": data.get("wa_id"),
+        "msg_id": data.get("msg_id"),
+        "bot": data.get("bot"),
+        "duration_ms": duration_ms,
+        "samples": profiler.samples,
+        "interval_ms": profiler.interval * 1000,
+        "top_functions": _format(profiler.top_functions(top_n), profiler.samples),
+        "stacks": "\n".join(f"{stack} {count}" for stack, count in profiler.top_stacks(top_n))
+    }).insert(ignore_permissions=True)
+
+    return doc.name
+
+
+@contextmanager
+def job_profile(wa_id: str = None, msg_id: str = None, bot: str = None):
+    """
+    Profile the enclosed block for a sample of jobs, keeping only slow ones.
+
+    Switched on from `ChatBot Config` with a sample rate & a slow job threshold.
+    """
+    settings = frappe.get_cached_doc("ChatBot Config")
+
+    if not profiling_enabled(settings) or not _sampled(settings):
+        yield
+        return
+
+    profiler = SamplingProfiler().start()
+    started_at = time.perf_counter()
+
+    try:
+        yield
+
+    finally:
+        profiler.stop()
+        duration_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        slow_ms = settings.get("profile_slow_ms")
+
+        if duration_ms >= (DEFAULT_SLOW_MS if slow_ms is None else frappe.utils.cint(slow_ms)):
+            try:
+                save_profile(
+                    profiler, duration_ms,
+                    top_n=frappe.utils.cint(settings.get("profile_top_n")) or DEFAULT_TOP_N,
+                    wa_id=wa_id, msg_id=msg_id, bot=bot
+                )
+            except Exception:
+                logger.warning("Failed to save job profile", exc_info=True)
@@ -1,33 +1,358 @@
-import frappe
-import frappe.utils.logger
+import atexit
+import copy
+import hashlib
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+
+import frappe
+import frappe.utils
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_LOG_MAX_LENGTH = 2000
+LOG_QUEUE_SIZE = 10000
+
+_REDACT_PATTERNS = [
+    (re.compile(r"(?i)bearer\s+[\w.\-]+"), "Bearer ***"),
+    (re.compile(r"""(?i)(['"]?\b(?:\w*token|\w*secret|password|pwd|sid|authorization)['"]?\s*[:=]\s*['"]?)[^'",\s}]+"""), r"\1***"),
+]
+
+# error flood control: one Error Log per fingerprint per window
+ERROR_WINDOW_SEC = 60
+ERROR_LOG_TITLE_MAX_LEN = 140
+_TRACE_FRAME = re.compile(r'File "([^"]+)", line (\d+), in (\S+)')
+
+# per-process logging state, the queue listener thread does not survive a fork
+_state = {"pid": None, "listeners": [], "config": None, "targets": {}}
+
+
+def redact(message: str, max_length: int = DEFAULT_LOG_MAX_LENGTH) -> str:
+    """Mask secrets in a log message and truncate it to max_length characters"""
+    for pattern, repl in _REDACT_PATTERNS:
+        message = pattern.sub(repl, message)
+
+    if max_length and len(message) > max_length:
+        message = f"{message[:max_length]}... [truncated {len(message) - max_length} chars]"
+
+    return message
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING, always keep warnings and errors"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+
+        return random.random() < self.rate
+
+
+class PywceQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background listener without blocking the caller.
+
+    Records are redacted & truncated before they leave the calling thread,
+    and dropped when the queue is full instead of waiting on it.
+    """
+
+    def __init__(self, log_queue, max_length: int = DEFAULT_LOG_MAX_LENGTH):
+        super().__init__(log_queue)
+        self.max_length = max_length
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.msg = redact(str(record.msg), self.max_length)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class PywceSyncHandler(logging.Handler):
+    """
+    Redacts & truncates records, then hands them to the real handlers in the calling thread.
 
-def setup_pywce_logging_for_frappe():
+    Used when async logging is off, so both modes mask the same data.
+    """
+
+    def __init__(self, handlers: list, max_length: int = DEFAULT_LOG_MAX_LENGTH):
+        super().__init__()
+        self.targets = handlers
+        self.max_length = max_length
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # copied, the caller's record is shared with any other handler
+        record = copy.copy(record)
+        record.msg = redact(record.getMessage(), self.max_length)
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info), self.max_length)
+            record.exc_info = None
+
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        record = self.prepare(record)
+
+        for handler in self.targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _stop_listeners():
+    for listener in _state["listeners"]:
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+    _state["listeners"] = []
+
+
+def _target_handlers(logger: logging.Logger) -> list:
+    """Real output handlers of a logger, captured before any queue handler replaced them"""
+    if logger.name not in _state["targets"]:
+        _state["targets"][logger.name] = [h for h in logger.handlers if not isinstance(h, (PywceQueueHandler, PywceSyncHandler))]
+
+    return _state["targets"][logger.name]
+
+
+def _install_queue(logger: logging.Logger, handlers: list, level: int, sample_rate: float, max_length: int):
+    for h in logger.handlers[:]:
+        logger.removeHandler(h)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _state["listeners"].append(listener)
+
+    queue_handler = PywceQueueHandler(log_queue, max_length=max_length)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+
+
+def _install_sync(logger: logging.Logger, handlers: list, level: int, sample_rate: float, max_length: int):
+    for h in logger.handlers[:]:
+        logger.removeHandler(h)
+
+    sync_handler = PywceSyncHandler(handlers, max_length=max_length)
+    sync_handler.addFilter(SamplingFilter(sample_rate))
+
+    logger.addHandler(sync_handler)
+    logger.setLevel(level)
+
+
+def _config_from_settings(settings) -> tuple:
+    if settings is None:
+        return DEFAULT_LOG_LEVEL, 1.0, DEFAULT_LOG_MAX_LENGTH, True
+
+    level = settings.get("log_level") or DEFAULT_LOG_LEVEL
+    sample_rate = settings.get("log_sample_rate")
+    max_length = settings.get("log_max_length")
+    use_queue = settings.get("async_logging")
+
+    return (
+        level,
+        1.0 if sample_rate is None else min(max(float(sample_rate), 0.0), 1.0),
+        DEFAULT_LOG_MAX_LENGTH if max_length is None else int(max_length),
+        True if use_queue is None else bool(frappe.utils.sbool(use_queue))
+    )
+
+
+def setup_pywce_logging_for_frappe(settings=None, force: bool = False):
     """
     Integrates pywce's logging into Frappe's logging system.
-    This function should be called once when your Frappe app starts up.
+
+    Level, sampling rate, truncation and queue mode are taken from `ChatBot Config`.
+    Safe to call on every engine build, it only reconfigures when settings change
+    or the process was forked.
     """
+    config = _config_from_settings(settings)
+
+    if not force and _state["pid"] == os.getpid() and _state["config"] == config:
+        return
+
+    level_name, sample_rate, max_length, use_queue = config
+    level = getattr(logging, str(level_name).upper(), logging.INFO)
+
+    if _state["pid"] == os.getpid():
+        _stop_listeners()
+    else:
+        # listener threads belong to the parent process
+        _state["listeners"] = []
+
+    app_handlers = _target_handlers(app_logger)
+
     pywce_root_logger = logging.getLogger('pywce')
-    frappe_logger = frappe.logger()
-    pywce_root_logger.setLevel(logging.DEBUG)
+    pywce_root_logger.propagate = False
+
+    if 'pywce' not in _state["targets"]:
+        pywce_handlers = list(app_handlers)
+
+        if frappe.conf.get("developer_mode"):
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            pywce_handlers.append(console_handler)
+
+        _state["targets"]['pywce'] = pywce_handlers
+
+    for logger, handlers in ((pywce_root_logger, _state["targets"]['pywce']), (app_logger, app_handlers)):
+        install = _install_queue if use_queue else _install_sync
+        install(logger, handlers, level, sample_rate, max_length)
+
+    _state["pid"] = os.getpid()
+    _state["config"] = config
+
+
+def flush_logs():
+    """
+    Job hook: write out the records still queued when a background job ends.
+
+    RQ ends a job's work horse with `os._exit`, which skips the atexit handler.
+    Listeners are stopped, which drains their queue, and started again for
+    workers that keep running.
+    """
+    if _state["pid"] != os.getpid():
+        return
+
+    for listener in _state["listeners"]:
+        try:
+            listener.stop()
+            listener.start()
+        except Exception:
+            pass
+
+
+def _error_fingerprint(title: str, traceback: str) -> str:
+    """Hash the title, stack frames & exception type, ignoring message values that vary per call"""
+    frames = _TRACE_FRAME.findall(traceback or "")
+    lines = (traceback or "").strip().splitlines()
+    exc_type = lines[-1].split(":", 1)[0] if lines else ""
+    raw = "|".join([title or "", exc_type, *[":".join(f) for f in frames]])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _error_keys(window: int) -> tuple:
+    return (
+        frappe.cache.make_key(f"fpw:errors:{window}"),
+        frappe.cache.make_key(f"fpw:errors:{window}:logs"),
+        frappe.cache.make_key("fpw:errors:windows")
+    )
+
+
+def report_error(title: str = None, message: str = None):
+    """
+    Rate limited replacement for `frappe.log_error`.
 
-    has_console_handler = any(isinstance(h, logging.StreamHandler) and h.stream.name == '<stderr>' for h in pywce_root_logger.handlers)
-    if not has_console_handler:
-        frappe_console_handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
-        frappe_console_handler.setFormatter(formatter)
-        pywce_root_logger.addHandler(frappe_console_handler)
+    Errors are fingerprinted by title & traceback and counted in redis. Only the first
+    occurrence in a window inserts an Error Log, `flush_error_summaries` later stamps
+    it with the repeat count.
+    """
+    message = message or frappe.get_traceback()
+    window = int(time.time() // ERROR_WINDOW_SEC)
+    fingerprint = _error_fingerprint(title, message)
+
+    try:
+        counts_key, logs_key, windows_key = _error_keys(window)
+
+        pipe = frappe.cache.pipeline()
+        pipe.hincrby(counts_key, fingerprint, 1)
+        pipe.expire(counts_key, ERROR_WINDOW_SEC * 10)
+        pipe.sadd(windows_key, window)
+        count = pipe.execute()[0]
+
+    except Exception:
+        # never lose the error because redis is unavailable
+        return frappe.log_error(title=title, message=message)
+
+    if count > 1:
+        return None
+
+    error_log = frappe.log_error(title=title, message=message)
+
+    try:
+        frappe.cache.pipeline().hset(logs_key, fingerprint, error_log.name).expire(logs_key, ERROR_WINDOW_SEC * 10).execute()
+    except Exception:
+        pass
+
+    return error_log
+
+
+def flush_error_summaries():
+    """Scheduler job: record suppressed repeat counts on the window's Error Log"""
+    current = int(time.time() // ERROR_WINDOW_SEC)
+    windows_key = _error_keys(current)[2]
+
+    windows = frappe.cache.pipeline().smembers(windows_key).execute()[0]
+
+    for raw_window in windows:
+        window = int(raw_window)
+
+        if window >= current:
+            continue
 
-        for handler in frappe_logger.handlers:
-            pywce_root_logger.addHandler(handler)
+        counts_key, logs_key, _ = _error_keys(window)
+        fingerprint_counts, fingerprint_logs = frappe.cache.pipeline().hgetall(counts_key).hgetall(logs_key).execute()
 
-    frappe_logger.addHandler(pywce_root_logger.handlers[0])
+        for fingerprint, count in fingerprint_counts.items():
+            count = int(count)
+            log_name = fingerprint_logs.get(fingerprint)
+
+            if count < 2 or not log_name:
+                continue
+
+            log_name = log_name.decode("utf-8") if isinstance(log_name, bytes) else log_name
+            title = frappe.db.get_value("Error Log", log_name, "method")
+
+            if title is None:
+                continue
+
+            suffix = f" [x{count} in {ERROR_WINDOW_SEC}s]"
+            frappe.db.set_value(
+                "Error Log", log_name, "method",
+                f"{title[:ERROR_LOG_TITLE_MAX_LEN - len(suffix)]}{suffix}",
+                update_modified=False
+            )
+
+        frappe.cache.pipeline().delete(counts_key, logs_key).srem(windows_key, raw_window).execute()
+
+    frappe.db.commit()
 
 
 def _get_logger():
-    frappe.utils.logger.set_log_level("DEBUG")
-    logger = frappe.logger("frappe_pywce", allow_site=True)
+    return frappe.logger("frappe_pywce", allow_site=True)
+
+
+class _LazyLogger:
+    """
+    Stands in for the app logger until first use.
+
+    Importing an app module then has no logging side effects, and the logger
+    is created in the site context of the first request or job that logs.
+    """
+    _logger = None
+
+    def __getattr__(self, name):
+        if self._logger is None:
+            self._logger = _get_logger()
+
+        return getattr(self._logger, name)
 
-    return logger
+app_logger = _LazyLogger()
 
-app_logger = _get_logger()
\ No newline at end of file
+atexit.register(_stop_listeners)
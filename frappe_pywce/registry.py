@@ -0,0 +1,179 @@
+import functools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Set
+
+import frappe
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.tracing import add_span
+
+# per-process call stats, pushed to redis at most every HOOK_STATS_FLUSH_SEC
+HOOK_STATS_FLUSH_SEC = 10
+HOOK_STATS_KEY = "fpw:hook_stats"
+HOOK_SLOW_MS = 1000
+
+_STATS: Dict[str, List[float]] = {}
+_STATS_LOCK = threading.Lock()
+_last_flush = [time.monotonic()]
+
+
+def flow_hook_paths(flow_json) -> Set[str]:
+    """Dotted paths of all hooks referenced by a studio flow, external hooks excluded"""
+    from pywce import EngineConstants
+
+    data = json.loads(flow_json) if isinstance(flow_json, str) else (flow_json or {})
+    paths = set()
+
+    for tpl in data.get("templates", []) or []:
+        for hook in tpl.get("hooks", []) or []:
+            path = (hook.get("path") or "").strip()
+
+            if path and not path.startswith(EngineConstants.EXT_HOOK_PROCESSOR_PLACEHOLDER):
+                paths.add(path)
+
+    return paths
+
+
+def _record(path: str, elapsed: float, ok: bool) -> None:
+    with _STATS_LOCK:
+        stats = _STATS.setdefault(path, [0, 0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += 0 if ok else 1
+        stats[2] += elapsed
+        stats[3] += 1 if elapsed * 1000 >= HOOK_SLOW_MS else 0
+
+    if time.monotonic() - _last_flush[0] >= HOOK_STATS_FLUSH_SEC:
+        flush_hook_stats()
+
+
+def flush_hook_stats() -> None:
+    """Add the buffered per-hook counters to the shared redis hash"""
+    with _STATS_LOCK:
+        pending = dict(_STATS)
+        _STATS.clear()
+        _last_flush[0] = time.monotonic()
+
+    if not pending:
+        return
+
+    try:
+        key = frappe.cache.make_key(HOOK_STATS_KEY)
+        pipe = frappe.cache.pipeline()
+
+        for path, (count, errors, elapsed, slow) in pending.items():
+            pipe.hincrby(key, f"{path}|count", count)
+            pipe.hincrby(key, f"{path}|errors", errors)
+            pipe.hincrby(key, f"{path}|total_us", int(elapsed * 1_000_000))
+            pipe.hincrby(key, f"{path}|slow", slow)
+
+        pipe.execute()
+
+    except Exception:
+        logger.debug("Failed to flush hook stats", exc_info=True)
+
+
+def _instrument(path: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    def hook(arg):
+        started_at = time.perf_counter()
+        ok = True
+
+        try:
+            return func(arg)
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            _record(path, elapsed, ok)
+
+            ended_at = time.time()
+            add_span("hook", ended_at - elapsed, ended_at, hook=path, ok=ok)
+
+    hook.__pywce_hook_path__ = path
+    return hook
+
+
+def register_hooks(paths: Set[str]) -> Dict[str, str]:
+    """
+    Resolve hooks once and register instrumented callables with pywce's HookService.
+
+    The engine then calls them straight from its registry, skipping the import
+    & attribute lookup. Returns unresolvable paths mapped to their error.
+    """
+    from pywce import HookService
+
+    registry = HookService.registry()
+    errors = {}
+
+    for path in paths:
+        if getattr(registry.get(path), "__pywce_hook_path__", None) == path:
+            continue
+
+        try:
+            func = HookService.load_function_from_dotted_path(path)
+        except ImportError as e:
+            errors[path] = str(e)
+            continue
+
+        HookService.register_hook(name=path, func=_instrument(path, func))
+
+    if errors:
+        logger.warning("Unresolvable flow hooks: %s", ", ".join(sorted(errors)))
+
+    return errors
+
+
+def validate_flow_hooks(flow_json) -> None:
+    """Fail flow save for hooks that cannot be imported"""
+    if not flow_json:
+        return
+
+    errors = register_hooks(flow_hook_paths(flow_json))
+
+    if errors:
+        frappe.throw(
+            frappe._("Flow references unknown hooks:<br>{0}").format("<br>".join(sorted(errors))),
+            title=frappe._("Invalid Flow Hooks")
+        )
+
+
+@frappe.whitelist()
+def get_hook_stats() -> List[Dict[str, Any]]:
+    """Per-hook call counts & latency across workers, slowest total time first"""
+    frappe.only_for("System Manager")
+
+    flush_hook_stats()
+
+    raw = frappe.cache.pipeline().hgetall(frappe.cache.make_key(HOOK_STATS_KEY)).execute()[0]
+    stats: Dict[str, Dict[str, int]] = {}
+
+    for field, value in raw.items():
+        field = field.decode("utf-8") if isinstance(field, bytes) else field
+        path, _, metric = field.rpartition("|")
+        stats.setdefault(path, {})[metric] = int(value)
+
+    rows = []
+
+    for path, s in stats.items():
+        count = s.get("count", 0)
+        total_ms = s.get("total_us", 0) / 1000
+
+        rows.append({
+            "hook": path,
+            "count": count,
+            "errors": s.get("errors", 0),
+            "slow": s.get("slow", 0),
+            "total_ms": round(total_ms, 2),
+            "avg_ms": round(total_ms / count, 2) if count else 0
+        })
+
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+@frappe.whitelist()
+def reset_hook_stats() -> None:
+    frappe.only_for("System Manager")
+    frappe.cache.pipeline().delete(frappe.cache.make_key(HOOK_STATS_KEY)).execute()
@@ -2,16 +2,15 @@ import hashlib
 import hmac
 import frappe
 
-from frappe_pywce.config import get_wa_config
-
-def verify_webhook_signature(request):
-    settings = frappe.get_single("ChatBot Config")
+def verify_webhook_signature(request, settings=None):
+    """Verify the payload signature against the app secret of the given bot settings, default `ChatBot Config`"""
+    settings = settings or frappe.get_single("ChatBot Config")
 
     if settings.env == "local":
         return True
     
     must_validate = frappe.utils.sbool(settings.validate_webhook_payload)
-    secret = get_wa_config(settings).config.app_secret
+    secret = settings.get_password('app_secret', raise_exception=False)
 
     if must_validate:
         if not secret:
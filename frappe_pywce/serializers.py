@@ -0,0 +1,142 @@
+import json
+import pickle
+import zlib
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+from frappe_pywce.pywce_logger import app_logger as logger
+
+# header: magic + codec byte + compression byte
+MAGIC = b"FPW1"
+HEADER_LEN = len(MAGIC) + 2
+
+CODEC_JSON = b"j"
+CODEC_ORJSON = b"o"
+CODEC_MSGPACK = b"m"
+
+COMPRESSION_NONE = b"n"
+COMPRESSION_ZLIB = b"z"
+COMPRESSION_LZ4 = b"l"
+
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+_CODECS = {"json": CODEC_JSON, "orjson": CODEC_ORJSON, "msgpack": CODEC_MSGPACK}
+_COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lz4": COMPRESSION_LZ4}
+
+
+def _available_codec(name: str) -> bytes:
+    if name == "auto":
+        return CODEC_MSGPACK if msgpack else (CODEC_ORJSON if orjson else CODEC_JSON)
+
+    codec = _CODECS.get(name, CODEC_JSON)
+
+    if (codec == CODEC_MSGPACK and msgpack is None) or (codec == CODEC_ORJSON and orjson is None):
+        logger.warning("Session serializer '%s' is not installed, falling back to json", name)
+        return CODEC_JSON
+
+    return codec
+
+
+def _available_compression(name: str) -> bytes:
+    compression = _COMPRESSIONS.get(name, COMPRESSION_ZLIB)
+
+    if compression == COMPRESSION_LZ4 and lz4_frame is None:
+        logger.warning("lz4 is not installed, falling back to zlib session compression")
+        return COMPRESSION_ZLIB
+
+    return compression
+
+
+class SessionSerializer:
+    """
+    Encodes session blobs for redis.
+
+    Payloads are msgpack / orjson / json, compressed with zlib or lz4 once they
+    grow past `threshold` bytes. Values written before this format existed
+    (pickled json strings from `frappe.cache.set_value`) are still readable.
+    """
+
+    def __init__(self, codec: str = "auto", compression: str = "zlib", threshold: int = DEFAULT_COMPRESS_THRESHOLD):
+        self.codec = _available_codec(codec or "auto")
+        self.compression = _available_compression(compression or "zlib")
+        self.threshold = threshold
+
+    @classmethod
+    def from_settings(cls, settings=None) -> "SessionSerializer":
+        if settings is None:
+            return cls()
+
+        threshold = settings.get("session_compress_threshold")
+
+        return cls(
+            codec=settings.get("session_serializer") or "auto",
+            compression=settings.get("session_compression") or "zlib",
+            threshold=DEFAULT_COMPRESS_THRESHOLD if threshold is None else int(threshold)
+        )
+
+    def _encode(self, data: Any) -> bytes:
+        if self.codec == CODEC_MSGPACK:
+            return msgpack.packb(data, use_bin_type=True)
+
+        if self.codec == CODEC_ORJSON:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, data: Any) -> bytes:
+        payload = self._encode(data)
+        compression = COMPRESSION_NONE
+
+        if self.compression != COMPRESSION_NONE and self.threshold and len(payload) > self.threshold:
+            if self.compression == COMPRESSION_LZ4:
+                payload = lz4_frame.compress(payload)
+            else:
+                payload = zlib.compress(payload, 1)
+
+            compression = self.compression
+
+        return MAGIC + self.codec + compression + payload
+
+    @staticmethod
+    def loads(raw: Optional[bytes]) -> Any:
+        if raw is None:
+            return None
+
+        if isinstance(raw, str):
+            return json.loads(raw)
+
+        if not raw.startswith(MAGIC):
+            # legacy value: pickled json string written by frappe.cache.set_value
+            value = pickle.loads(raw)
+            return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+        codec = raw[len(MAGIC):len(MAGIC) + 1]
+        compression = raw[len(MAGIC) + 1:HEADER_LEN]
+        payload = raw[HEADER_LEN:]
+
+        if compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSION_LZ4:
+            payload = lz4_frame.decompress(payload)
+
+        if codec == CODEC_MSGPACK:
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+        if codec == CODEC_ORJSON:
+            return orjson.loads(payload)
+
+        return json.loads(payload)
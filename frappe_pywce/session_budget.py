@@ -0,0 +1,221 @@
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import frappe
+import frappe.utils
+
+from pywce import SessionConstants
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_MAX_KEYS = 256
+
+# size histograms are kept per hour for a day
+STATS_WINDOW_SEC = 3600
+STATS_RETENTION_SEC = 86400
+
+# every engine owned key must survive eviction, e.g. stages, auth, retry & debounce
+# state. History is trimmed separately, user props are dropped last
+PROTECTED_KEYS = frozenset(
+    value for name, value in vars(SessionConstants).items()
+    if name.isupper() and isinstance(value, str) and value != SessionConstants.MESSAGE_HISTORY
+)
+
+
+def _bucket(value: int) -> int:
+    """Power of two upper bound of value, used as histogram bucket"""
+    return 1 << max(int(value) - 1, 0).bit_length()
+
+
+def _stats_key(window: int = None) -> str:
+    if window is None:
+        window = int(time.time() // STATS_WINDOW_SEC)
+
+    return frappe.cache.make_key(create_cache_key(f"session_sizes:{window}"))
+
+
+class SessionBudget:
+    """
+    Byte & key limits for a single user session blob.
+
+    When a session outgrows its budget, entries are evicted in this order:
+
+        1. oldest `SessionConstants.MESSAGE_HISTORY` entries
+        2. least recently written keys, skipping `PROTECTED_KEYS` and the props key
+        3. the props key
+
+    Protected keys are never evicted, so a session made only of them may stay over budget.
+    A limit of 0 disables it.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_keys: int = DEFAULT_MAX_KEYS,
+                 protected_keys: Iterable[str] = PROTECTED_KEYS):
+        self.max_bytes = max_bytes
+        self.max_keys = max_keys
+        self.protected_keys = frozenset(protected_keys)
+
+    @classmethod
+    def from_settings(cls, settings=None) -> "SessionBudget":
+        if settings is None:
+            return cls()
+
+        max_bytes = settings.get("session_max_bytes")
+        max_keys = settings.get("session_max_keys")
+
+        return cls(
+            max_bytes=DEFAULT_MAX_BYTES if max_bytes is None else frappe.utils.cint(max_bytes),
+            max_keys=DEFAULT_MAX_KEYS if max_keys is None else frappe.utils.cint(max_keys)
+        )
+
+    def _evictable(self, data: Dict[str, Any], prop_key: str) -> list:
+        keys = [k for k in data if k not in self.protected_keys and k != prop_key and k != SessionConstants.MESSAGE_HISTORY]
+
+        if prop_key in data:
+            keys.append(prop_key)
+
+        return keys
+
+    def _trim_history(self, data: Dict[str, Any], overflow: int, ratio: float) -> int:
+        """Drop the oldest history entries covering `overflow` encoded bytes, returns the count dropped"""
+        history = data.get(SessionConstants.MESSAGE_HISTORY)
+
+        if not isinstance(history, list) or not history:
+            return 0
+
+        dropped, freed = 0, 0
+
+        while dropped < len(history) and freed < overflow:
+            freed += max(int(len(json.dumps(history[dropped], default=str)) * ratio), 1)
+            dropped += 1
+
+        data[SessionConstants.MESSAGE_HISTORY] = history[dropped:]
+        return dropped
+
+    def enforce(self, data: Dict[str, Any], encode: Callable[[Dict[str, Any]], bytes], prop_key: str = None) -> tuple:
+        """
+        Fit the session into the budget.
+
+        Args:
+            data: session data, trimmed in place
+            encode: serializer used to measure the stored size
+            prop_key: user props key, evicted after all other unprotected keys
+
+        Returns:
+            (payload, stats) where payload is the encoded session and stats
+            counts evicted history entries & keys
+        """
+        stats = {"history": 0, "keys": 0}
+
+        if self.max_keys and len(data) > self.max_keys:
+            for key in self._evictable(data, prop_key)[:len(data) - self.max_keys]:
+                data.pop(key, None)
+                stats["keys"] += 1
+
+        payload = encode(data)
+
+        if not self.max_bytes or len(payload) <= self.max_bytes:
+            return payload, stats
+
+        evictable = self._evictable(data, prop_key)
+
+        while len(payload) > self.max_bytes:
+            overflow = len(payload) - self.max_bytes
+            # encoded bytes per json byte, accounts for compression
+            ratio = len(payload) / max(len(json.dumps(data, default=str)), 1)
+
+            dropped = self._trim_history(data, overflow, ratio)
+
+            if dropped:
+                stats["history"] += dropped
+
+            elif evictable:
+                data.pop(evictable.pop(0), None)
+                stats["keys"] += 1
+
+            else:
+                break
+
+            payload = encode(data)
+
+        return payload, stats
+
+
+def record_session_size(pipe, size: int, keys: int, stats: Optional[Dict[str, int]] = None) -> None:
+    """Add a session write to the hourly size histograms on the given redis pipeline"""
+    key = _stats_key()
+
+    pipe.hincrby(key, f"bytes:{_bucket(size)}", 1)
+    pipe.hincrby(key, f"keys:{_bucket(keys)}", 1)
+    pipe.hincrby(key, "writes", 1)
+    pipe.hincrby(key, "total_bytes", size)
+
+    for name, count in (stats or {}).items():
+        if count:
+            pipe.hincrby(key, f"evicted:{name}", count)
+
+    pipe.expire(key, STATS_RETENTION_SEC)
+
+
+def _percentile(histogram: Dict[int, int], total: int, pct: float) -> int:
+    rank, seen = total * pct, 0
+
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+
+        if seen >= rank:
+            return bucket
+
+    return 0
+
+
+@frappe.whitelist()
+def get_session_size_report(hours: int = 24) -> Dict[str, Any]:
+    """
+    Session size distribution over the last `hours`, measured on every user session write.
+
+    Buckets are power of two upper bounds, percentiles are bucket approximations.
+    """
+    frappe.only_for("System Manager")
+
+    hours = min(max(frappe.utils.cint(hours) or 24, 1), STATS_RETENTION_SEC // STATS_WINDOW_SEC)
+    current = int(time.time() // STATS_WINDOW_SEC)
+
+    pipe = frappe.cache.pipeline()
+
+    for window in range(current - hours + 1, current + 1):
+        pipe.hgetall(_stats_key(window))
+
+    sizes, keys, totals = {}, {}, {"writes": 0, "total_bytes": 0, "evicted:history": 0, "evicted:keys": 0}
+
+    for window in pipe.execute():
+        for field, count in window.items():
+            field = field.decode("utf-8") if isinstance(field, bytes) else field
+            count = int(count)
+
+            if field in totals:
+                totals[field] += count
+                continue
+
+            kind, _, bucket = field.partition(":")
+            histogram = sizes if kind == "bytes" else keys
+            histogram[int(bucket)] = histogram.get(int(bucket), 0) + count
+
+    writes = totals["writes"]
+
+    if not writes:
+        logger.debug("No session size samples in the last %s hours", hours)
+
+    return {
+        "hours": hours,
+        "writes": writes,
+        "avg_bytes": int(totals["total_bytes"] / writes) if writes else 0,
+        "bytes": {"p50": _percentile(sizes, writes, 0.5), "p95": _percentile(sizes, writes, 0.95),
+                  "p99": _percentile(sizes, writes, 0.99), "histogram": dict(sorted(sizes.items()))},
+        "keys": {"p50": _percentile(keys, writes, 0.5), "p95": _percentile(keys, writes, 0.95),
+                 "histogram": dict(sorted(keys.items()))},
+        "evicted_history": totals["evicted:history"],
+        "evicted_keys": totals["evicted:keys"],
+    }
@@ -0,0 +1,93 @@
+from typing import Optional
+
+import frappe
+
+from frappe_pywce.pywce_logger import app_logger as logger
+
+CACHE_KEY_PREFIX = "fpw:"
+
+# redis expiry of a user session since its last write
+SESSION_TTL_SEC = 1800
+
+# session keys live under a generation numbered namespace, `fpw:g<N>:`.
+# clearing all sessions bumps N, old keys expire by ttl or get purged in the background
+SESSION_PURGE_SCAN_COUNT = 1000
+SESSION_PURGE_MAX_ITERATIONS = 100
+
+def create_cache_key(k:str):
+    return f'{CACHE_KEY_PREFIX}{k}'
+
+def _generation_key() -> str:
+    return frappe.cache.make_key(create_cache_key("generation"))
+
+def session_generation() -> int:
+    """Current session namespace generation, read from redis once per request / job"""
+    generation = getattr(frappe.local, "pywce_session_generation", None)
+
+    if generation is None:
+        raw = frappe.cache.get(_generation_key())
+        generation = frappe.local.pywce_session_generation = int(raw or 0)
+
+    return generation
+
+def bump_session_generation() -> int:
+    """Move all session keys to a fresh namespace, O(1) regardless of keyspace size"""
+    generation = frappe.local.pywce_session_generation = int(frappe.cache.incr(_generation_key()))
+    return generation
+
+def namespaced_cache_key(k: str) -> str:
+    return create_cache_key(f"g{session_generation()}:{k}")
+
+def whatsapp_session_name(wa_id: str, bot: Optional[str] = None) -> str:
+    """`WhatsApp Session` name of a user's login on a bot, the wa_id alone for the default bot"""
+    return f"{bot}:{wa_id}" if bot else wa_id
+
+def auth_session_cache_key(wa_id: str, bot: Optional[str] = None) -> str:
+    """Cache key of a user's login on a bot, see `util.save_whatsapp_session`"""
+    return namespaced_cache_key(f"session:{whatsapp_session_name(wa_id, bot)}")
+
+def _key_generation(key, prefix: str) -> Optional[int]:
+    key = key.decode("utf-8") if isinstance(key, bytes) else key
+    generation = key[len(prefix):].split(":", 1)[0]
+    return int(generation) if generation.isdigit() else None
+
+def purge_stale_sessions(scan_count: int = SESSION_PURGE_SCAN_COUNT, max_iterations: int = SESSION_PURGE_MAX_ITERATIONS) -> int:
+    """
+    Scheduler job: unlink session keys of older generations.
+
+    Walks the keyspace incrementally with SCAN, resuming from the cursor of the
+    previous run, so it never blocks redis the way a pattern delete does.
+    """
+    current = session_generation()
+
+    if current == 0:
+        return 0
+
+    state_key = frappe.cache.make_key(create_cache_key("purge"))
+    state = frappe.cache.pipeline().hgetall(state_key).execute()[0]
+    state = {k.decode("utf-8") if isinstance(k, bytes) else k: int(v) for k, v in state.items()}
+
+    if state.get("generation") == current and state.get("cursor", 0) == 0:
+        return 0
+
+    cursor = state.get("cursor", 0) if state.get("generation") == current else 0
+    prefix = frappe.cache.make_key(create_cache_key("g"))
+    purged = 0
+
+    for _ in range(max_iterations):
+        cursor, keys = frappe.cache.scan(cursor=cursor, match=f"{prefix}*", count=scan_count)
+        stale = [k for k in keys if (_key_generation(k, prefix) or current) < current]
+
+        if stale:
+            frappe.cache.unlink(*stale)
+            purged += len(stale)
+
+        if cursor == 0:
+            break
+
+    frappe.cache.pipeline().hset(state_key, mapping={"generation": current, "cursor": cursor}).execute()
+
+    if purged:
+        logger.info("Purged %s stale session keys", purged)
+
+    return purged
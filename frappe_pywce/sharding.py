@@ -0,0 +1,81 @@
+import bisect
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+import frappe.utils
+
+DEFAULT_REPLICAS = 128
+
+# per-process rings, keyed by the configured shard queues
+_RINGS: Dict[Tuple[str, ...], "HashRing"] = {}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over queue names.
+
+    Each queue is placed on the ring `replicas` times, a key belongs to the first
+    queue point clockwise of its hash. Adding or removing a queue only moves
+    the keys of roughly 1/N of the ring.
+    """
+
+    def __init__(self, shards: List[str], replicas: int = DEFAULT_REPLICAS):
+        self.shards = list(dict.fromkeys(shards))
+        self._points: List[int] = []
+        self._owners: List[str] = []
+
+        ring = sorted((_hash(f"{shard}#{i}"), shard) for shard in self.shards for i in range(replicas))
+
+        for point, shard in ring:
+            self._points.append(point)
+            self._owners.append(shard)
+
+    def shard_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[idx]
+
+    def __len__(self):
+        return len(self.shards)
+
+
+def shard_queues(settings) -> List[str]:
+    """Queue names configured for sharding, one per line, empty when sharding is off"""
+    raw = settings.get("shard_queues") or ""
+    return [q.strip() for q in raw.splitlines() if q.strip()]
+
+
+def get_ring(queues: List[str]) -> HashRing:
+    key = tuple(queues)
+    ring = _RINGS.get(key)
+
+    if ring is None:
+        ring = _RINGS[key] = HashRing(queues)
+
+    return ring
+
+
+def shard_for(settings, wa_id: str, bot: str = None) -> Optional[str]:
+    """
+    Queue owning the conversation, None when sharding is disabled.
+
+    Each shard queue must be drained by exactly one worker for the ordering guarantee to hold.
+    """
+    queues = shard_queues(settings)
+
+    if not queues:
+        return None
+
+    return get_ring(queues).shard_for(f"{bot}:{wa_id}" if bot else wa_id)
+
+
+def shard_lock_free(settings) -> bool:
+    """Skip the per-user lock for sharded jobs, ordering then relies on one worker per shard queue"""
+    return bool(frappe.utils.cint(settings.get("shard_skip_lock")))
@@ -0,0 +1,42 @@
+from frappe.tests import UnitTestCase
+
+from frappe_pywce.analytics import _STAGE_SEP, _transitions, stage_funnel
+
+
+class TestStageFunnel(UnitTestCase):
+    def setUp(self):
+        # 10 users start, 6 pick a product, 4 pay, 1 of them goes back to the menu
+        self.counts = {
+            ("", "MENU"): 10,
+            ("MENU", "PRODUCT"): 6,
+            ("PRODUCT", "PAY"): 4,
+            ("PAY", "MENU"): 1,
+        }
+
+    def test_entries_exits_and_drop_offs(self):
+        stages = {s["stage"]: s for s in stage_funnel(self.counts)["stages"]}
+
+        self.assertEqual(stages["MENU"], {"stage": "MENU", "entries": 11, "exits": 6, "drop_offs": 5})
+        self.assertEqual(stages["PRODUCT"], {"stage": "PRODUCT", "entries": 6, "exits": 4, "drop_offs": 2})
+        self.assertEqual(stages["PAY"], {"stage": "PAY", "entries": 4, "exits": 1, "drop_offs": 3})
+
+    def test_sorted_by_count(self):
+        funnel = stage_funnel(self.counts)
+
+        self.assertEqual([s["stage"] for s in funnel["stages"]], ["MENU", "PRODUCT", "PAY"])
+        self.assertEqual([t["transitions"] for t in funnel["transitions"]], [10, 6, 4, 1])
+        self.assertEqual(funnel["transitions"][0], {"from_stage": None, "to_stage": "MENU", "transitions": 10})
+
+    def test_drop_offs_are_never_negative(self):
+        # exits counted in a window whose entries were rolled up before the date range
+        stages = stage_funnel({("MENU", "PRODUCT"): 3})["stages"]
+
+        self.assertEqual({s["stage"]: s["drop_offs"] for s in stages}, {"PRODUCT": 3, "MENU": 0})
+
+    def test_empty(self):
+        self.assertEqual(stage_funnel({}), {"stages": [], "transitions": []})
+
+    def test_transitions_from_redis_hash(self):
+        raw = {f"{_STAGE_SEP}MENU".encode(): b"10", f"MENU{_STAGE_SEP}PRODUCT".encode(): b"6"}
+
+        self.assertEqual(_transitions(raw), {("", "MENU"): 10, ("MENU", "PRODUCT"): 6})
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_pywce.ingress import IngressServer, dedupe_key, delivery_id, verify_signature
+
+SECRET = "app-secret"
+BODY = json.dumps({
+    "entry": [{"changes": [{"value": {"messages": [{"id": "wamid.test", "from": "263771234567"}]}}]}]
+}).encode("utf-8")
+
+
+def _sign(body: bytes, secret: str = SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class TestIngressSignature(UnitTestCase):
+    def test_valid_signature(self):
+        self.assertTrue(verify_signature(BODY, _sign(BODY), [SECRET]))
+        self.assertTrue(verify_signature(BODY, _sign(BODY).split("=", 1)[1], [SECRET]))
+
+    def test_any_configured_secret(self):
+        self.assertTrue(verify_signature(BODY, _sign(BODY, "other"), [SECRET, "other"]))
+
+    def test_invalid_signature(self):
+        self.assertFalse(verify_signature(BODY, _sign(BODY, "wrong"), [SECRET]))
+        self.assertFalse(verify_signature(BODY + b" ", _sign(BODY), [SECRET]))
+        self.assertFalse(verify_signature(BODY, None, [SECRET]))
+        self.assertFalse(verify_signature(BODY, _sign(BODY), []))
+
+    def test_delivery_id(self):
+        self.assertEqual(delivery_id(json.loads(BODY)), "wamid.test")
+
+        status = {"entry": [{"changes": [{"value": {"statuses": [{"id": "wamid.test", "status": "read"}]}}]}]}
+        self.assertEqual(delivery_id(status), "wamid.test:read")
+        self.assertIsNone(delivery_id({"entry": []}))
+
+
+class TestIngressDedupe(UnitTestCase):
+    def setUp(self):
+        self.site = f"test-{frappe.generate_hash(length=10)}"
+
+    def run_with_server(self, test):
+        # one event loop per test, the redis connection pool is bound to it
+        async def run():
+            server = IngressServer(self.site, frappe.conf.redis_cache, ["token"], [SECRET])
+
+            try:
+                await test(server)
+            finally:
+                await server.redis.delete(server.stream, dedupe_key(self.site, "wamid.test"))
+                await server.redis.aclose()
+
+        asyncio.run(run())
+
+    def test_duplicates_are_appended_once(self):
+        async def test(server):
+            self.assertEqual((await server.accept(BODY, {"x-hub-signature-256": _sign(BODY)}))[0], 200)
+            self.assertEqual((await server.accept(BODY, {"x-hub-signature-256": _sign(BODY)}))[0], 200)
+            self.assertEqual(await server.redis.xlen(server.stream), 1)
+
+        self.run_with_server(test)
+
+    def test_failed_append_is_not_deduped(self):
+        async def test(server):
+            # a key of the wrong type makes the append fail
+            await server.redis.set(server.stream, "not a stream")
+            self.assertEqual((await server.accept(BODY, {"x-hub-signature-256": _sign(BODY)}))[0], 503)
+
+            await server.redis.delete(server.stream)
+            self.assertEqual((await server.accept(BODY, {"x-hub-signature-256": _sign(BODY)}))[0], 200)
+            self.assertEqual(await server.redis.xlen(server.stream), 1)
+
+        self.run_with_server(test)
+
+    def test_rejects_bad_signature(self):
+        async def test(server):
+            self.assertEqual((await server.accept(BODY, {"x-hub-signature-256": _sign(BODY, "wrong")}))[0], 403)
+            self.assertEqual(await server.redis.exists(server.stream), 0)
+
+        self.run_with_server(test)
+
+    def test_challenge(self):
+        async def test(server):
+            self.assertEqual(server.challenge("/?hub.mode=subscribe&hub.verify_token=token&hub.challenge=42"), (200, b"42"))
+            self.assertEqual(server.challenge("/?hub.mode=subscribe&hub.verify_token=nope&hub.challenge=42")[0], 403)
+
+        self.run_with_server(test)
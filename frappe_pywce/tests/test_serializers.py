@@ -0,0 +1,56 @@
+import json
+import pickle
+
+from frappe.tests import UnitTestCase
+
+from frappe_pywce.serializers import (
+    CODEC_JSON,
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    HEADER_LEN,
+    MAGIC,
+    SessionSerializer
+)
+
+SESSION = {"pywce_current_stage": "START MENU", "pywce_props": {"name": "Jane", "age": 30}, "pywce_history": ["a", "b"]}
+
+
+class TestSessionSerializer(UnitTestCase):
+    def test_round_trip_all_codecs(self):
+        for codec in ("auto", "json", "orjson", "msgpack"):
+            for compression in ("none", "zlib", "lz4"):
+                serializer = SessionSerializer(codec=codec, compression=compression, threshold=16)
+                self.assertEqual(serializer.loads(serializer.dumps(SESSION)), SESSION, (codec, compression))
+
+    def test_header(self):
+        raw = SessionSerializer(codec="json", compression="zlib").dumps(SESSION)
+
+        self.assertTrue(raw.startswith(MAGIC))
+        self.assertEqual(raw[len(MAGIC):len(MAGIC) + 1], CODEC_JSON)
+        self.assertEqual(raw[len(MAGIC) + 1:HEADER_LEN], COMPRESSION_NONE)
+
+    def test_compresses_past_threshold(self):
+        large = {"blob": "x" * 5000}
+        raw = SessionSerializer(codec="json", compression="zlib", threshold=1024).dumps(large)
+
+        self.assertEqual(raw[len(MAGIC) + 1:HEADER_LEN], COMPRESSION_ZLIB)
+        self.assertLess(len(raw), 5000)
+        self.assertEqual(SessionSerializer.loads(raw), large)
+
+    def test_threshold_zero_disables_compression(self):
+        raw = SessionSerializer(codec="json", compression="zlib", threshold=0).dumps({"blob": "x" * 5000})
+        self.assertEqual(raw[len(MAGIC) + 1:HEADER_LEN], COMPRESSION_NONE)
+
+    def test_reads_legacy_values(self):
+        # frappe.cache.set_value pickled the json string
+        self.assertEqual(SessionSerializer.loads(pickle.dumps(json.dumps(SESSION))), SESSION)
+        self.assertEqual(SessionSerializer.loads(pickle.dumps(SESSION)), SESSION)
+        self.assertEqual(SessionSerializer.loads(json.dumps(SESSION)), SESSION)
+        self.assertIsNone(SessionSerializer.loads(None))
+
+    def test_from_settings(self):
+        serializer = SessionSerializer.from_settings({"session_serializer": "json", "session_compression": "none", "session_compress_threshold": 0})
+
+        self.assertEqual(serializer.codec, CODEC_JSON)
+        self.assertEqual(serializer.compression, COMPRESSION_NONE)
+        self.assertEqual(serializer.threshold, 0)
@@ -0,0 +1,74 @@
+import json
+
+from frappe.tests import UnitTestCase
+
+from pywce import SessionConstants
+
+from frappe_pywce.session_budget import PROTECTED_KEYS, SessionBudget
+
+PROPS = "fpw:props"
+
+
+def _encode(data):
+    return json.dumps(data).encode("utf-8")
+
+
+class TestSessionBudget(UnitTestCase):
+    def test_protects_engine_keys(self):
+        for key in (SessionConstants.CURRENT_STAGE, SessionConstants.DYNAMIC_RETRY,
+                    SessionConstants.CURRENT_STAGE_RETRY_COUNT, SessionConstants.CURRENT_DEBOUNCE):
+            self.assertIn(key, PROTECTED_KEYS)
+
+        self.assertNotIn(SessionConstants.MESSAGE_HISTORY, PROTECTED_KEYS)
+
+    def test_key_limit_evicts_oldest_unprotected_first(self):
+        data = {
+            SessionConstants.CURRENT_STAGE: "MENU",
+            PROPS: {"name": "Jane"},
+            "first": 1,
+            SessionConstants.DYNAMIC_RETRY: True,
+            "second": 2,
+            "third": 3
+        }
+
+        _, stats = SessionBudget(max_bytes=0, max_keys=4).enforce(data, _encode, prop_key=PROPS)
+
+        self.assertEqual(stats["keys"], 2)
+        self.assertEqual(list(data), [SessionConstants.CURRENT_STAGE, PROPS, SessionConstants.DYNAMIC_RETRY, "third"])
+
+    def test_props_are_evicted_last(self):
+        data = {PROPS: {"name": "Jane"}, "a": 1, "b": 2}
+
+        SessionBudget(max_bytes=0, max_keys=1).enforce(data, _encode, prop_key=PROPS)
+        self.assertEqual(list(data), [PROPS])
+
+    def test_byte_limit_trims_history_first(self):
+        data = {
+            SessionConstants.CURRENT_STAGE: "MENU",
+            "extra": "y" * 50,
+            SessionConstants.MESSAGE_HISTORY: [{"msg": "x" * 100} for _ in range(20)]
+        }
+
+        payload, stats = SessionBudget(max_bytes=1000, max_keys=0).enforce(data, _encode, prop_key=PROPS)
+
+        self.assertLessEqual(len(payload), 1000)
+        self.assertGreater(stats["history"], 0)
+        self.assertEqual(stats["keys"], 0)
+        self.assertIn("extra", data)
+        self.assertEqual(payload, _encode(data))
+
+    def test_byte_limit_never_evicts_protected_keys(self):
+        data = {SessionConstants.CURRENT_STAGE: "x" * 500, SessionConstants.CURRENT_DEBOUNCE: 1, "extra": "y" * 500}
+
+        payload, stats = SessionBudget(max_bytes=100, max_keys=0).enforce(data, _encode, prop_key=PROPS)
+
+        self.assertEqual(stats["keys"], 1)
+        self.assertEqual(list(data), [SessionConstants.CURRENT_STAGE, SessionConstants.CURRENT_DEBOUNCE])
+        self.assertGreater(len(payload), 100)
+
+    def test_zero_limits_disable_budget(self):
+        data = {str(i): "x" * 100 for i in range(50)}
+        _, stats = SessionBudget(max_bytes=0, max_keys=0).enforce(data, _encode)
+
+        self.assertEqual(stats, {"history": 0, "keys": 0})
+        self.assertEqual(len(data), 50)
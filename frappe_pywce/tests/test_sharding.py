@@ -0,0 +1,54 @@
+from frappe.tests import UnitTestCase
+
+from frappe_pywce.sharding import HashRing, shard_for, shard_queues
+
+QUEUES = ["shard-1", "shard-2", "shard-3", "shard-4"]
+USERS = [f"26377{i:07d}" for i in range(4000)]
+
+
+class TestHashRing(UnitTestCase):
+    def test_same_key_same_shard(self):
+        ring, other = HashRing(QUEUES), HashRing(list(reversed(QUEUES)))
+
+        for user in USERS[:100]:
+            self.assertEqual(ring.shard_for(user), ring.shard_for(user))
+            self.assertEqual(ring.shard_for(user), other.shard_for(user))
+
+    def test_distribution(self):
+        ring = HashRing(QUEUES)
+        counts = {queue: 0 for queue in QUEUES}
+
+        for user in USERS:
+            counts[ring.shard_for(user)] += 1
+
+        expected = len(USERS) / len(QUEUES)
+
+        for queue, count in counts.items():
+            self.assertGreater(count, expected * 0.7, queue)
+            self.assertLess(count, expected * 1.3, queue)
+
+    def test_adding_a_shard_moves_few_keys(self):
+        before, after = HashRing(QUEUES), HashRing(QUEUES + ["shard-5"])
+        moved = [user for user in USERS if before.shard_for(user) != after.shard_for(user)]
+
+        # about 1/5 of the keys, all of them to the new shard
+        self.assertLess(len(moved), len(USERS) * 0.3)
+        self.assertTrue(all(after.shard_for(user) == "shard-5" for user in moved))
+
+    def test_removing_a_shard_only_moves_its_keys(self):
+        before, after = HashRing(QUEUES), HashRing(QUEUES[:-1])
+
+        for user in USERS:
+            if before.shard_for(user) != QUEUES[-1]:
+                self.assertEqual(before.shard_for(user), after.shard_for(user))
+
+    def test_duplicates_and_empty(self):
+        self.assertEqual(len(HashRing(["a", "b", "a"])), 2)
+        self.assertIsNone(HashRing([]).shard_for("263771234567"))
+
+    def test_settings(self):
+        settings = {"shard_queues": " shard-1\n\nshard-2 \n"}
+
+        self.assertEqual(shard_queues(settings), ["shard-1", "shard-2"])
+        self.assertIsNone(shard_for({}, "263771234567"))
+        self.assertIn(shard_for(settings, "263771234567", bot="bot-a"), ["shard-1", "shard-2"])
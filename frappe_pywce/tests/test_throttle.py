@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_pywce.sessions import create_cache_key
+from frappe_pywce.throttle import acquire
+
+# 60 tokens per minute, one per second
+SETTINGS = frappe._dict(throttle_inbound=1, throttle_rate=60, throttle_burst=3)
+NOW = 1_700_000_000.0
+
+
+class TestThrottle(UnitTestCase):
+    def setUp(self):
+        self.wa_id = f"test-{frappe.generate_hash(length=10)}"
+
+    def tearDown(self):
+        for bot in (None, "other"):
+            key = create_cache_key(f"throttle:{bot}:{self.wa_id}" if bot else f"throttle:{self.wa_id}")
+            frappe.cache.delete_value([key, f"{key}:notified"])
+
+    def acquire(self, at: float = NOW, bot: str = None):
+        with patch("frappe_pywce.throttle.time.time", return_value=at):
+            return acquire(SETTINGS, self.wa_id, bot)
+
+    def test_burst_then_reject(self):
+        self.assertEqual([self.acquire() for _ in range(3)], [(True, False)] * 3)
+        self.assertEqual(self.acquire(), (False, True))
+        # only the first rejected message of a flood is notified
+        self.assertEqual(self.acquire(), (False, False))
+
+    def test_refill(self):
+        for _ in range(4):
+            self.acquire()
+
+        self.assertEqual(self.acquire(NOW + 0.5), (False, False))
+        self.assertEqual(self.acquire(NOW + 1), (True, False))
+        self.assertEqual(self.acquire(NOW + 1), (False, False))
+
+    def test_refill_is_capped_at_burst(self):
+        self.acquire()
+        later = NOW + 3600
+
+        self.assertEqual([self.acquire(later)[0] for _ in range(4)], [True, True, True, False])
+
+    def test_buckets_per_bot(self):
+        for _ in range(3):
+            self.acquire()
+
+        self.assertFalse(self.acquire()[0])
+        self.assertTrue(self.acquire(bot="other")[0])
+
+    def test_redis_failure_allows(self):
+        with patch("frappe_pywce.throttle._token_bucket", side_effect=ConnectionError):
+            self.assertEqual(self.acquire(), (True, False))
@@ -0,0 +1,96 @@
+import time
+from typing import Optional, Tuple
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+DEFAULT_RATE_PER_MIN = 20
+DEFAULT_BURST = 5
+
+# token bucket per user, refilled continuously at `rate` tokens per second.
+# returns {allowed, notify}: notify is 1 for the first rejected message until the bucket is full again
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local ttl = math.ceil(burst / rate) + 1
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local notify = 0
+
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+elseif redis.call('SET', KEYS[2], 1, 'NX', 'EX', ttl) then
+    notify = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+
+return {allowed, notify}
+"""
+
+_script = {}
+
+
+def throttle_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("throttle_inbound")))
+
+
+def _limits(settings) -> Tuple[float, int]:
+    """(tokens per second, bucket size)"""
+    rate = frappe.utils.cint(settings.get("throttle_rate")) or DEFAULT_RATE_PER_MIN
+    burst = frappe.utils.cint(settings.get("throttle_burst")) or DEFAULT_BURST
+    return rate / 60, max(burst, 1)
+
+
+def throttle_reply(settings) -> Optional[str]:
+    return (settings.get("throttle_reply") or "").strip() or None
+
+
+def _token_bucket():
+    if "bucket" not in _script:
+        _script["bucket"] = frappe.cache.register_script(_TOKEN_BUCKET_LUA)
+
+    return _script["bucket"]
+
+
+def acquire(settings, wa_id: str, bot: str = None) -> Tuple[bool, bool]:
+    """
+    Take a token from the user's bucket.
+
+    Returns:
+        (allowed, notify), notify is True for the first rejected message of a flood
+    """
+    rate, burst = _limits(settings)
+    key = frappe.cache.make_key(create_cache_key(f"throttle:{bot}:{wa_id}" if bot else f"throttle:{wa_id}"))
+
+    try:
+        allowed, notify = _token_bucket()(keys=[key, f"{key}:notified"], args=[rate, burst, time.time()], client=frappe.cache)
+    except Exception:
+        # never drop messages because redis scripting failed
+        logger.warning("Throttle check failed for %s", wa_id, exc_info=True)
+        return True, False
+
+    return bool(allowed), bool(notify)
+
+
+def send_notice(wa_id: str, message: str, bot: str = None) -> None:
+    """Send a plain text notice, e.g. to tell a throttled user to slow down"""
+    from frappe_pywce.bots import bot_profile
+    from frappe_pywce.config import get_wa_config
+
+    try:
+        get_wa_config(bot_profile(bot)).send_message(recipient_id=wa_id, message=message)
+    except Exception:
+        logger.warning("Failed to send notice to %s", wa_id, exc_info=True)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import frappe
+import frappe.utils
+
+from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.sessions import create_cache_key
+
+TRACE_TTL_SEC = 86400
+TRACE_LOGGER = "pywce_traces"
+
+EXPORTER_REDIS = "Redis"
+EXPORTER_LOG = "Log File"
+
+
+def trace_id_for(msg_id: str) -> str:
+    """Trace id of a message, derived from its id so Meta retries join the same trace"""
+    return hashlib.blake2b(str(msg_id).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def tracing_enabled(settings) -> bool:
+    return bool(frappe.utils.cint(settings.get("trace_messages")))
+
+
+def current_trace_id() -> Optional[str]:
+    state = getattr(frappe.local, "pywce_trace", None)
+    return None if state is None else state["trace_id"]
+
+
+def _trace_key(trace_id: str) -> str:
+    return frappe.cache.make_key(create_cache_key(f"trace:{trace_id}"))
+
+
+def add_span(name: str, start: float, end: float, **attrs) -> None:
+    """Record a span measured by the caller, epoch start & end. A no-op outside `trace()`"""
+    state = getattr(frappe.local, "pywce_trace", None)
+
+    if state is None:
+        return
+
+    entry = {"name": name, "start": round(start, 6), "ms": round((end - start) * 1000, 2), "pid": os.getpid()}
+    entry.update({k: v for k, v in attrs.items() if v is not None})
+    state["spans"].append(entry)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block as a span of the current trace"""
+    if getattr(frappe.local, "pywce_trace", None) is None:
+        yield
+        return
+
+    started_at = time.time()
+
+    try:
+        yield
+    finally:
+        add_span(name, started_at, time.time(), **attrs)
+
+
+def _export(state: Dict[str, Any]) -> None:
+    if not state["spans"]:
+        return
+
+    try:
+        if state["exporter"] == EXPORTER_LOG:
+            frappe.logger(TRACE_LOGGER, allow_site=True).info(json.dumps({"trace_id": state["trace_id"], "spans": state["spans"]}))
+            return
+
+        key = _trace_key(state["trace_id"])
+        frappe.cache.pipeline().rpush(key, *[json.dumps(s) for s in state["spans"]]).expire(key, TRACE_TTL_SEC).execute()
+
+    except Exception:
+        logger.debug("Failed to export trace %s", state["trace_id"], exc_info=True)
+
+
+@contextmanager
+def trace(trace_id: Optional[str]):
+    """
+    Collect the spans of the enclosed block under trace_id, exported on exit.
+
+    Each process a message passes through, web worker, media job & conversation
+    job, appends its own spans to the trace. A no-op without trace_id.
+    """
+    if not trace_id:
+        yield
+        return
+
+    previous = getattr(frappe.local, "pywce_trace", None)
+    exporter = frappe.get_cached_doc("ChatBot Config").get("trace_exporter") or EXPORTER_REDIS
+    state = frappe.local.pywce_trace = {"trace_id": trace_id, "spans": [], "exporter": exporter}
+
+    try:
+        yield
+    finally:
+        frappe.local.pywce_trace = previous
+        _export(state)
+
+
+@frappe.whitelist()
+def get_trace(msg_id: str = None, trace_id: str = None) -> List[Dict[str, Any]]:
+    """Spans of a message, in start order with their offset from the first span"""
+    frappe.only_for("System Manager")
+
+    if not trace_id:
+        if not msg_id:
+            frappe.throw(frappe._("Message ID or Trace ID is required"))
+
+        trace_id = trace_id_for(msg_id)
+
+    raw = frappe.cache.pipeline().lrange(_trace_key(trace_id), 0, -1).execute()[0]
+    spans = sorted((json.loads(s) for s in raw), key=lambda s: s["start"])
+
+    if spans:
+        origin = spans[0]["start"]
+
+        for s in spans:
+            s["offset_ms"] = round((s["start"] - origin) * 1000, 2)
+
+    return spans
@@ -1,14 +1,19 @@
 import datetime
 import json
+import time
 
 import frappe
 from frappe.sessions import get_expiry_in_seconds
 from frappe.utils import now_datetime
+from frappe.utils.jinja import guess_is_path
+from jinja2 import TemplateError
 
-from pywce import HookUtil, SessionConstants
-
-from frappe_pywce.managers import FrappeRedisSessionManager
-from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.analytics import capture_event
+from frappe_pywce.bots import current_bot
+from frappe_pywce.load_shedding import is_degraded
+from frappe_pywce.sessions import auth_session_cache_key, whatsapp_session_name
+from frappe_pywce.tracing import span
+from frappe_pywce.pywce_logger import app_logger as logger, report_error
 
 # constants
 LOGIN_LINK_EXPIRE_AFTER_IN_MIN = 5
@@ -24,6 +29,11 @@ TEMPLATE_HOOK_ERROR_KEY = "error"
 TEMPLATE_HOOK_DOCTYPE_KEY = "doctype"
 TEMPLATE_HOOK_DOCTYPE_NAME_KEY = "doctype_name"
 
+# per-process jinja code objects of flow strings, keyed by source
+TEMPLATE_CODE_CACHE_SIZE = 2048
+_JINJA_MARKERS = ("{{", "{%", "{#")
+_TEMPLATE_CODE = {}
+
 def create_cache_key(k:str):
     return f'{CACHE_KEY_PREFIX}{k}'
 
@@ -37,7 +47,14 @@ def bot_settings():
         frappe.throw(frappe._("Failed to fetch Bot Settings: {0}").format(str(e)))
 
 def save_whatsapp_session(wa_id: str, sid: str, user: str, desired_ttl_minutes: int|None=None, created_from: str|None=None):
-    """Persist mapping in DocType and cache. TTL chosen as min(desired ttl, Frappe session remaining)."""
+    """Persist mapping in DocType and cache. TTL chosen as min(desired ttl, Frappe session remaining).
+
+    The login is saved for the bot of the current webhook / login link only, see `bots.current_bot`.
+    """
+    from pywce import SessionConstants
+    from frappe_pywce.managers import FrappeRedisSessionManager
+
+    bot = current_bot()
     session_manager = FrappeRedisSessionManager()
 
     desired_ttl_minutes = desired_ttl_minutes or LOGIN_DURATION_IN_MIN
@@ -73,6 +90,7 @@ def save_whatsapp_session(wa_id: str, sid: str, user: str, desired_ttl_minutes:
             "doctype": "WhatsApp Session",
             "provider": "whatsapp",
             "wa_id": wa_id,
+            "bot": bot,
             "sid": sid,
             "user": user,
             "expires_on": expires_on,
@@ -84,7 +102,7 @@ def save_whatsapp_session(wa_id: str, sid: str, user: str, desired_ttl_minutes:
         logger.debug("Created WhatsApp Session: %s", doc.name)
 
     except frappe.DuplicateEntryError:
-        doc = frappe.get_doc("WhatsApp Session", wa_id)
+        doc = frappe.get_doc("WhatsApp Session", whatsapp_session_name(wa_id, bot))
         doc.sid = sid
         doc.user = user
         doc.expires_on = expires_on
@@ -92,7 +110,7 @@ def save_whatsapp_session(wa_id: str, sid: str, user: str, desired_ttl_minutes:
         doc.save(ignore_permissions=True)
 
     except:
-        frappe.log_error(title="WhatsAppSession Creation Error")
+        report_error(title="WhatsAppSession Creation Error")
         return False
 
     session_data = {
@@ -109,24 +127,63 @@ def save_whatsapp_session(wa_id: str, sid: str, user: str, desired_ttl_minutes:
     # Cache for quick lookup (optional)
     try:
         payload = json.dumps({"sid": sid, "user": user, "expires_on": expires_on})
-        frappe.cache.set_value(create_cache_key(f"session:{wa_id}"), payload, expires_in_sec=ttl_seconds)
+        frappe.cache.set_value(auth_session_cache_key(wa_id, bot), payload, expires_in_sec=ttl_seconds)
         return True
     except Exception:
         logger.debug("Unable to set cache for wa_id=%s", wa_id)
         return False
 
+def compile_template(source: str):
+    """Jinja code object of a template string, compiled once per process"""
+    code = _TEMPLATE_CODE.get(source)
+
+    if code is None:
+        if len(_TEMPLATE_CODE) >= TEMPLATE_CODE_CACHE_SIZE:
+            _TEMPLATE_CODE.pop(next(iter(_TEMPLATE_CODE)))
+
+        code = _TEMPLATE_CODE[source] = frappe.get_jenv().compile(source)
+
+    return code
+
+def render_string(value: str, context: dict) -> str:
+    """
+    Render a template string like `frappe.render_template`.
+
+    Compiled code is reused, so a message is not re-parsed by jinja on every
+    render. The jinja environment is still the current request's one, with its
+    globals. Strings without jinja markers skip jinja and are returned
+    unchanged, including a trailing newline jinja would drop.
+    """
+    if not value.strip() or ".__" in value or guess_is_path(value):
+        return frappe.render_template(value, context)
+
+    if not any(marker in value for marker in _JINJA_MARKERS):
+        return value
+
+    try:
+        jenv = frappe.get_jenv()
+        tpl = jenv.template_class.from_code(jenv, compile_template(value), jenv.make_globals(None))
+        return tpl.render(context)
+
+    except TemplateError:
+        frappe.throw(title="Jinja Template Error", msg=f"<pre>{value}</pre><pre>{frappe.get_traceback()}</pre>")
+
 def frappe_recursive_renderer(template_dict: dict, hook_path: str, hook_arg: object, ext_hook_processor: object) -> dict:
     """
     It does two things:
     1. Gets the business context from the hook.
     2. Gets the dt, dn from template or params 
-    3. Recursively renders the template using frappe.render_template, which
+    3. Recursively renders the template with the Frappe jinja environment, which
        adds the global Frappe context automatically.
     """
+    from pywce import HookUtil
     
-    # Get Business Context (from the template hook)
+    # Get Business Context (from the template hook), skipped under overload
     business_context = {}
-    if hook_path:
+    if hook_path and not is_degraded():
+        started_at = time.time()
+        status = "ok"
+
         try:
             response = HookUtil.process_hook(
                 hook=hook_path,
@@ -135,9 +192,18 @@ def frappe_recursive_renderer(template_dict: dict, hook_path: str, hook_arg: obj
             )
             business_context = response.template_body.render_template_payload 
         except Exception as e:
-            frappe.log_error(title="Hook RecursiveRenderer Error")
+            status = "error"
+            report_error(title="Hook RecursiveRenderer Error")
             business_context = {TEMPLATE_HOOK_ERROR_KEY: str(e)}
 
+        capture_event(
+            "hook",
+            wa_id=getattr(hook_arg, "session_id", None),
+            hook=hook_path,
+            status=status,
+            duration_ms=round((time.time() - started_at) * 1000, 2)
+        )
+
     # Get doctype context (if available)
     doc_context = {}
     try:
@@ -154,7 +220,7 @@ def frappe_recursive_renderer(template_dict: dict, hook_path: str, hook_arg: obj
             doc_context = {"doc": loaded_doc}
 
     except Exception:
-        frappe.log_error(title="Hook RecursiveRenderer DocLoad Error")
+        report_error(title="Hook RecursiveRenderer DocLoad Error")
         doc_context = {"doc": None}
 
     # Combine all contexts
@@ -165,7 +231,7 @@ def frappe_recursive_renderer(template_dict: dict, hook_path: str, hook_arg: obj
 
     def render_recursive(value):
         if isinstance(value, str):
-            return frappe.render_template(value, final_context)
+            return render_string(value, final_context)
         
         elif isinstance(value, dict):
             return {key: render_recursive(val) for key, val in value.items()}
@@ -175,4 +241,5 @@ def frappe_recursive_renderer(template_dict: dict, hook_path: str, hook_arg: obj
         
         return value
 
-    return render_recursive(template_dict)
\ No newline at end of file
+    with span("template.render"):
+        return render_recursive(template_dict)
\ No newline at end of file
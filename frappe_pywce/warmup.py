@@ -0,0 +1,105 @@
+import time
+from typing import Dict, Optional
+
+import frappe
+
+from frappe_pywce.bots import PROFILE_DOCTYPE, bot_profile
+from frappe_pywce.pywce_logger import app_logger as logger
+
+def _walk_strings(value):
+    if isinstance(value, str):
+        yield value
+
+    elif isinstance(value, dict):
+        for val in value.values():
+            yield from _walk_strings(val)
+
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _walk_strings(item)
+
+
+def _compile_templates(templates: dict) -> int:
+    from frappe_pywce.util import _JINJA_MARKERS, compile_template
+
+    compiled = 0
+
+    for source in _walk_strings(templates):
+        if ".__" in source or not any(marker in source for marker in _JINJA_MARKERS):
+            continue
+
+        try:
+            compile_template(source)
+            compiled += 1
+        except Exception:
+            # reported when the template is rendered
+            logger.debug("Skipped invalid template string: %s", source[:80])
+
+    return compiled
+
+
+def warm_bot(bot: Optional[str] = None) -> Dict[str, float]:
+    """Build the bot engine: flow translation, hooks & compiled message templates"""
+    from frappe_pywce.config import get_engine_config
+
+    started_at = time.perf_counter()
+    engine = get_engine_config(bot)
+    storage = engine.config.storage_manager
+
+    return {
+        "templates": len(storage.templates()),
+        "compiled": _compile_templates(storage.templates()),
+        "ms": round((time.perf_counter() - started_at) * 1000, 2)
+    }
+
+
+def warm_up() -> Dict[str, Dict[str, float]]:
+    """
+    Prime the per-process caches of the current site for every enabled bot.
+
+    pywce opens a new http client per request, so there is no pool to keep
+    open; creating one here still loads httpx, ssl and the CA bundle.
+    Nothing is imported for a site without a bot flow.
+    """
+    started_at = time.perf_counter()
+    report = {}
+
+    bots = [None] + frappe.get_all(PROFILE_DOCTYPE, filters={"enabled": 1}, pluck="name")
+
+    for bot in bots:
+        if not bot_profile(bot).get("active_flow_version"):
+            continue
+
+        if not report:
+            import httpx
+            httpx.Client().close()
+
+        try:
+            report[bot or "default"] = warm_bot(bot)
+        except Exception as e:
+            logger.warning("Failed to warm up bot %s: %s", bot or "default", e)
+            report[bot or "default"] = {"error": str(e)}
+
+    logger.info("Warmed up %s bot(s) in %sms", len(report), round((time.perf_counter() - started_at) * 1000, 2))
+
+    return report
+
+
+
+def warm_sites(sites_path: str = ".") -> None:
+    """Warm every site of the bench that has the app installed, in the current process"""
+    from frappe.utils import get_sites
+
+    for site in get_sites(sites_path):
+        try:
+            frappe.init(site=site, sites_path=sites_path)
+            frappe.connect()
+
+            if "frappe_pywce" in frappe.get_installed_apps():
+                warm_up()
+
+        except Exception:
+            logger.warning("Failed to warm up site %s", site, exc_info=True)
+
+        finally:
+            frappe.destroy()
@@ -1,4 +1,6 @@
 import json
+import socket
+import time
 
 import redis
 import redis.exceptions
@@ -6,9 +8,33 @@ import redis.exceptions
 import frappe
 import frappe.utils
 
+from frappe_pywce.analytics import capture_event, event_batch, events_enabled
+from frappe_pywce.auth import find_session_sid, mark_session_used
+from frappe_pywce.bots import bot_for_verify_token, bot_profile, bot_queue, resolve_bot, set_current_bot
 from frappe_pywce.config import get_engine_config, get_wa_config
-from frappe_pywce.util import CACHE_KEY_PREFIX, LOCK_WAIT_TIME, LOCK_LEASE_TIME, bot_settings, create_cache_key
-from frappe_pywce.pywce_logger import app_logger as logger
+from frappe_pywce.dead_letter import INGRESS_REASON, dead_letter
+from frappe_pywce.ingress import stream_key as ingress_stream_key
+from frappe_pywce.load_shedding import SHED_BUSY_REPLY, busy_reply, claim_busy_reply, overloaded, set_degraded, shed_mode, shedding_enabled
+from frappe_pywce.media import attach_media, find_media, hold_key, hold_message, max_media_bytes, media_enabled, media_queue, next_held, release_held
+from frappe_pywce.profiling import job_profile
+from frappe_pywce.registry import flush_hook_stats
+from frappe_pywce.sessions import bump_session_generation
+from frappe_pywce.sharding import shard_for, shard_lock_free
+from frappe_pywce.throttle import acquire, send_notice, throttle_enabled, throttle_reply
+from frappe_pywce.tracing import add_span, span, trace, trace_id_for, tracing_enabled
+from frappe_pywce.util import LOCK_WAIT_TIME, LOCK_LEASE_TIME, create_cache_key
+from frappe_pywce.pywce_logger import app_logger as logger, setup_pywce_logging_for_frappe, report_error
+
+# consumer group draining the standalone ingress stream. One drain job per
+# site runs at a time on INGRESS_QUEUE, entries failing INGRESS_MAX_DELIVERIES
+# times are dead lettered
+INGRESS_GROUP = "pywce"
+INGRESS_QUEUE = "long"
+INGRESS_BATCH_SIZE = 100
+INGRESS_BLOCK_MS = 1000
+INGRESS_RUN_FOR_SEC = 55
+INGRESS_CLAIM_IDLE_MS = 60000
+INGRESS_MAX_DELIVERIES = 3
 
 
 def _verifier():
@@ -21,32 +47,84 @@ def _verifier():
 
     mode, token, challenge = params.get("hub.mode"), params.get("hub.verify_token"), params.get("hub.challenge")
 
-    if get_wa_config(bot_settings()).util.webhook_challenge(mode, challenge, token):
+    if get_wa_config(bot_profile(bot_for_verify_token(token))).util.webhook_challenge(mode, challenge, token):
         from werkzeug.wrappers import Response
         return Response(challenge)
 
     frappe.throw("Webhook verification challenge failed", exc=frappe.PermissionError)
 
 
-def _internal_webhook_handler(wa_id:str, payload:dict):
-    """Process webhook data internally
+def _process_webhook(payload: dict, wa_id: str, msg_id: str = None, bot: str = None):
+    with job_profile(wa_id=wa_id, msg_id=msg_id, bot=bot), span("engine.process", bot=bot):
+        get_engine_config(bot).process_webhook(payload)
+
+def _internal_webhook_handler(wa_id:str, payload:dict, msg_id:str=None, enqueued_at:float=None, bot:str=None, lock:bool=True,
+                              trace_id:str=None, degraded:bool=False, attempt:int=1) -> str:
+    """Process webhook data internally, failed & dropped messages are dead lettered for replay
 
     Args:
+        wa_id (str): whatsapp user id, used for the per-user FIFO lock
         payload (dict): webhook raw payload data to process
-        headers (dict): request headers
+        msg_id (str): incoming message id, for event capture
+        enqueued_at (float): epoch time the job was enqueued, for event capture
+        bot (str): `ChatBot Profile` the webhook was routed to, None for the default bot
+        lock (bool): take the per-user FIFO lock, off for sharded queues drained by a single worker
+        trace_id (str): trace the job spans are added to, None when tracing is off
+        degraded (bool): enqueued under overload, template hooks are skipped
+        attempt (int): processing attempt, above 1 for dead letter replays
+
+    Returns:
+        status: ok, dropped or error
     """
+    started_at = time.time()
+    status = "ok"
 
-    try:
-        lock_key =  create_cache_key(f"lock:{wa_id}")
-        
-        with frappe.cache().lock(lock_key, timeout=LOCK_LEASE_TIME, blocking_timeout=LOCK_WAIT_TIME):
-            get_engine_config().process_webhook(payload)
+    set_current_bot(bot)
+    set_degraded(degraded)
+
+    # kept for replay when the message fails
+    job = dict(wa_id=wa_id, payload=payload, msg_id=msg_id, bot=bot, trace_id=trace_id)
+
+    with event_batch(events_enabled()), trace(trace_id):
+        if enqueued_at:
+            add_span("queue.wait", enqueued_at, started_at)
 
-    except redis.exceptions.LockError:
-        logger.critical("FIFO Enforcement: Dropped concurrent message for %s due to lock error.", wa_id)
+        try:
+            if not lock:
+                _process_webhook(payload, wa_id, msg_id, bot)
 
-    except Exception:
-        frappe.log_error(title="Chatbot Webhook E.Handler")
+            else:
+                lock_key =  create_cache_key(f"lock:{bot}:{wa_id}" if bot else f"lock:{wa_id}")
+                lock_requested_at = time.time()
+                
+                with frappe.cache().lock(lock_key, timeout=LOCK_LEASE_TIME, blocking_timeout=LOCK_WAIT_TIME):
+                    add_span("lock.wait", lock_requested_at, time.time())
+                    _process_webhook(payload, wa_id, msg_id, bot)
+
+        except redis.exceptions.LockError:
+            status = "dropped"
+            logger.critical("FIFO Enforcement: Dropped concurrent message for %s due to lock error.", wa_id)
+            dead_letter(status, job, error="Lock wait timed out", attempt=attempt)
+
+        except Exception:
+            status = "error"
+            report_error(title="Chatbot Webhook E.Handler")
+            dead_letter(status, job, error=frappe.get_traceback(), attempt=attempt)
+
+        capture_event(
+            "message",
+            wa_id=wa_id,
+            msg_id=msg_id,
+            bot=bot,
+            status=status,
+            duration_ms=round((time.time() - started_at) * 1000, 2),
+            queue_ms=round((started_at - enqueued_at) * 1000, 2) if enqueued_at else None
+        )
+
+    # job processes may not outlive the job
+    flush_hook_stats()
+
+    return status
 
 def _on_job_success(*args, **kwargs):
     logger.debug("Webhook job completed successfully, args: %s, kwargs %s", args, kwargs)
@@ -62,38 +140,286 @@ def _handle_webhook():
     except json.JSONDecodeError:
         frappe.throw("Invalid webhook data", exc=frappe.ValidationError)
 
-    should_run_in_bg = frappe.db.get_single_value("ChatBot Config", "process_in_background")
+    return dispatch_webhook(payload_dict)
 
-    wa_user = get_wa_config(bot_settings()).util.get_wa_user(payload_dict)
+def dispatch_webhook(payload_dict: dict, received_at: float = None) -> str:
+    """Route a verified webhook payload to its bot and enqueue it for processing
+
+    Args:
+        payload_dict (dict): webhook payload
+        received_at (float): epoch time the standalone ingress accepted the payload
+    """
+    dispatched_at = time.time()
+    bot = resolve_bot(payload_dict)
+    profile = bot_profile(bot)
+    settings = frappe.get_cached_doc("ChatBot Config")
+    setup_pywce_logging_for_frappe(settings)
+
+    if bot and not profile.enabled:
+        logger.warning("Dropped webhook for disabled bot profile: %s", bot)
+        return "OK"
+
+    should_run_in_bg = frappe.utils.cint(profile.process_in_background)
+
+    wa_user = get_wa_config(profile).util.get_wa_user(payload_dict)
 
     if wa_user is None:
         return "Invalid user"
+
+    if throttle_enabled(settings):
+        allowed, notify = acquire(settings, wa_user.wa_id, bot)
+
+        if not allowed:
+            logger.warning("Throttled message %s from %s", wa_user.msg_id, wa_user.wa_id)
+
+            with event_batch(events_enabled()):
+                capture_event("message", wa_id=wa_user.wa_id, msg_id=wa_user.msg_id, bot=bot, status="throttled")
+
+            reply = throttle_reply(settings)
+
+            if notify and reply:
+                frappe.enqueue(send_notice, queue="short", now=should_run_in_bg == 0, wa_id=wa_user.wa_id, message=reply, bot=bot)
+
+            return "OK"
     
-    job_id = f"{wa_user.wa_id}:{wa_user.msg_id}"
+    job_id = f"{bot}:{wa_user.wa_id}:{wa_user.msg_id}" if bot else f"{wa_user.wa_id}:{wa_user.msg_id}"
+
+    # sharded mode pins each conversation to one queue
+    shard = shard_for(settings, wa_user.wa_id, bot) if should_run_in_bg else None
     
     logger.debug("Starting a new webhook job id: %s", job_id)
 
-    frappe.enqueue(
-        _internal_webhook_handler,
-        now=should_run_in_bg == 0,
+    queue = shard or bot_queue(profile)
+    degraded = bool(should_run_in_bg) and shedding_enabled(settings) and overloaded(settings, queue)
+
+    if degraded:
+        logger.warning("Queue %s is overloaded, shedding message %s", queue, wa_user.msg_id)
+
+        with event_batch(events_enabled()):
+            capture_event("message", wa_id=wa_user.wa_id, msg_id=wa_user.msg_id, bot=bot, status="shed")
+
+        if shed_mode(settings) == SHED_BUSY_REPLY:
+            # kept for replay once the queue has caught up
+            dead_letter("shed", dict(wa_id=wa_user.wa_id, payload=payload_dict, msg_id=wa_user.msg_id, bot=bot),
+                        error=f"Queue {queue} is overloaded")
+
+            reply = busy_reply(settings)
+
+            if reply and claim_busy_reply(wa_user.wa_id, bot):
+                frappe.enqueue(send_notice, queue="short", wa_id=wa_user.wa_id, message=reply, bot=bot)
+
+            return "OK"
+
+    trace_id = trace_id_for(wa_user.msg_id) if tracing_enabled(settings) else None
+
+    job = dict(
+        queue=queue,
 
         payload=payload_dict,
         wa_id=wa_user.wa_id,
+        msg_id=wa_user.msg_id,
+        enqueued_at=time.time(),
+        bot=bot,
+        lock=shard is None or not shard_lock_free(settings),
+        trace_id=trace_id,
+        degraded=degraded,
 
-        job_id= create_cache_key(job_id),
-        on_success=_on_job_success,
-        on_failure=_on_job_error
+        job_id= create_cache_key(job_id)
     )
 
+    has_media = media_enabled(settings) and find_media(payload_dict) is not None
+
+    with trace(trace_id):
+        if received_at:
+            add_span("ingress.wait", received_at, dispatched_at)
+
+        with span("webhook.dispatch", bot=bot, queue=job["queue"]):
+            if not should_run_in_bg:
+                if has_media:
+                    attach_media(payload_dict, get_wa_config(profile), max_media_bytes(settings), wa_id=wa_user.wa_id)
+
+                _enqueue_conversation(job, now=True)
+                return "OK"
+
+            if media_enabled(settings):
+                # media downloads off the conversational path, the user's
+                # messages wait behind it so they are still processed in order
+                key = hold_key(wa_user.wa_id, bot)
+                held = hold_message(key, dict(job, media=has_media), has_media)
+
+                if held == 0:
+                    frappe.enqueue(_media_stage, queue=media_queue(settings), key=key, bot=bot)
+
+                if held >= 0:
+                    return "OK"
+
+            _enqueue_conversation(job)
+
     return "OK"
 
+def _enqueue_conversation(job: dict, now: bool = False):
+    frappe.enqueue(_internal_webhook_handler, now=now, on_success=_on_job_success, on_failure=_on_job_error, **job)
+
+def _media_stage(key: str, bot: str = None):
+    """Store the media of a user's held messages as Files, enqueueing their conversation jobs in order"""
+    settings = frappe.get_cached_doc("ChatBot Config")
+    set_current_bot(bot)
+    wa = get_wa_config(bot_profile(bot))
+
+    while True:
+        job = next_held(key)
+
+        if job is None:
+            break
+
+        if job.pop("media", False):
+            with trace(job.get("trace_id")), span("media.download"):
+                attach_media(job["payload"], wa, max_media_bytes(settings), wa_id=job["wa_id"])
+
+            # the conversation job reads the File
+            frappe.db.commit()
+
+        _enqueue_conversation(job)
+
+        if not release_held(key):
+            break
+
+def _ingress_consumer_name() -> str:
+    """Stable per host, a single drain job per site reads the stream at a time"""
+    return socket.gethostname()
+
+def _drop_idle_consumers(key: str, consumer: str) -> None:
+    """Forget other consumers without pending entries, e.g. of hosts no longer draining"""
+    for info in frappe.cache.xinfo_consumers(key, INGRESS_GROUP):
+        name = info["name"].decode("utf-8") if isinstance(info["name"], bytes) else info["name"]
+
+        if name != consumer and not info["pending"]:
+            frappe.cache.xgroup_delconsumer(key, INGRESS_GROUP, name)
+
+def _ensure_ingress_group(key: str) -> bool:
+    """Create the consumer group, False when the ingress never wrote to this site"""
+    if not frappe.cache.pipeline().exists(key).execute()[0]:
+        return False
+
+    try:
+        frappe.cache.xgroup_create(key, INGRESS_GROUP, id="0")
+    except redis.exceptions.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    return True
+
+def _dispatch_ingress_entry(fields: dict) -> None:
+    """Dispatch a stream entry as the WhatsApp user's logged in session, like `auth.whatsapp_session_hook`"""
+    payload = json.loads(fields[b"payload"])
+    bot = resolve_bot(payload)
+    set_current_bot(bot)
+
+    user = mark_session_used(payload, bot) if find_session_sid(payload, bot) else None
+    frappe.set_user(user or "Guest")
+
+    try:
+        dispatch_webhook(payload, received_at=frappe.utils.flt(fields.get(b"received_at")) or None)
+    finally:
+        frappe.set_user("Administrator")
+
+def _ingress_failed(key: str, entry_id, fields: dict) -> None:
+    """
+    Leave a failed entry pending, it is reclaimed & retried after INGRESS_CLAIM_IDLE_MS.
+
+    After INGRESS_MAX_DELIVERIES it is moved to the dead letter store instead.
+    """
+    frappe.db.rollback()
+    report_error(title="Chatbot Ingress Dispatch")
+
+    pending = frappe.cache.xpending_range(key, INGRESS_GROUP, min=entry_id, max=entry_id, count=1)
+    deliveries = pending[0]["times_delivered"] if pending else INGRESS_MAX_DELIVERIES
+
+    if deliveries >= INGRESS_MAX_DELIVERIES:
+        payload = json.loads(fields[b"payload"])
+        bot = resolve_bot(payload)
+
+        try:
+            wa_user = get_wa_config(bot_profile(bot)).util.get_wa_user(payload)
+        except Exception:
+            wa_user = None
+
+        job = dict(payload=payload, bot=bot, wa_id=wa_user.wa_id if wa_user else None, msg_id=wa_user.msg_id if wa_user else None)
+
+        if dead_letter(INGRESS_REASON, job, error=frappe.get_traceback(), attempt=deliveries):
+            frappe.cache.pipeline().xack(key, INGRESS_GROUP, entry_id).xdel(key, entry_id).execute()
+
+    frappe.db.commit()
+
+def consume_ingress_stream() -> None:
+    """
+    Scheduler job: start draining the standalone ingress stream, see `frappe_pywce.ingress`.
+
+    The drain blocks on the stream, so it runs on INGRESS_QUEUE and at most once per site.
+    """
+    if not _ensure_ingress_group(ingress_stream_key(frappe.local.site)):
+        return
+
+    frappe.enqueue(
+        drain_ingress_stream,
+        queue=INGRESS_QUEUE,
+        job_id=create_cache_key(f"ingress:{frappe.local.site}"),
+        deduplicate=True
+    )
+
+def drain_ingress_stream(run_for: int = INGRESS_RUN_FOR_SEC, batch_size: int = INGRESS_BATCH_SIZE) -> int:
+    """
+    Dispatch webhooks written by the standalone ingress.
+
+    Blocks on the stream for up to `run_for` seconds. Entries left pending by a failed
+    dispatch or a dead consumer are reclaimed after INGRESS_CLAIM_IDLE_MS.
+    """
+    key = ingress_stream_key(frappe.local.site)
+
+    if not _ensure_ingress_group(key):
+        return 0
+
+    consumer = _ingress_consumer_name()
+    deadline = time.monotonic() + run_for
+    consumed = 0
+
+    claimed = frappe.cache.xautoclaim(key, INGRESS_GROUP, consumer, INGRESS_CLAIM_IDLE_MS, start_id="0-0", count=batch_size)
+    entries = claimed[1] if claimed else []
+    _drop_idle_consumers(key, consumer)
+
+    while True:
+        for entry_id, fields in entries:
+            try:
+                _dispatch_ingress_entry(fields)
+            except Exception:
+                _ingress_failed(key, entry_id, fields)
+                continue
+
+            # acknowledged once its writes are committed
+            frappe.db.commit()
+            frappe.cache.pipeline().xack(key, INGRESS_GROUP, entry_id).xdel(key, entry_id).execute()
+            consumed += 1
+
+        if time.monotonic() >= deadline:
+            break
+
+        response = frappe.cache.xreadgroup(INGRESS_GROUP, consumer, {key: ">"}, count=batch_size, block=INGRESS_BLOCK_MS)
+        entries = response[0][1] if response else []
+
+    if consumed:
+        logger.debug("Consumed %s ingress webhooks", consumed)
+
+    return consumed
+
 @frappe.whitelist()
 def get_webhook():
     return frappe.utils.get_request_site_address() + '/api/method/frappe_pywce.webhook.webhook'
 
 @frappe.whitelist()
 def clear_session():
-    frappe.cache.delete_keys(CACHE_KEY_PREFIX)
+    # same as `FrappeRedisSessionManager.clear_all`, process global caches
+    # compare the generation on read, without loading the engine on `bench clear-cache`
+    bump_session_generation()
 
 @frappe.whitelist(allow_guest=True, methods=["GET", "POST"])
 def webhook():
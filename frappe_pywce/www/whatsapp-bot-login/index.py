@@ -3,13 +3,14 @@ import urllib.parse
 
 import frappe
 
-from frappe_pywce.util import bot_settings, save_whatsapp_session
+from frappe_pywce.bots import bot_profile, set_current_bot
+from frappe_pywce.util import save_whatsapp_session
 
 from frappe_pywce.pywce_logger import app_logger as logger
 
 
-def _get_bot_number() -> str:
-    number = bot_settings().chatbot_mobile_number
+def _get_bot_number(bot: str = None) -> str:
+    number = bot_profile(bot).chatbot_mobile_number
     return ''.join(filter(str.isdigit, number))
 
 def get_context(context):
@@ -50,6 +51,9 @@ def get_context(context):
 
             session_id = token_doc.wa_id
             user = frappe.session.user
+
+            # save the auth session into the requesting bot's session namespace
+            set_current_bot(token_doc.bot)
             save_result = save_whatsapp_session(session_id, frappe.session.sid, user)
 
             logger.debug("Saved WhatsApp session result: %s", save_result)
@@ -57,7 +61,7 @@ def get_context(context):
             # text to show logged in menu
             text = "menu"
             encoded_text = urllib.parse.quote(text)
-            wa_link = f"https://wa.me/{_get_bot_number()}?text={encoded_text}"
+            wa_link = f"https://wa.me/{_get_bot_number(token_doc.bot)}?text={encoded_text}"
                 
             context.message_title = "Success!"
             context.message = f"Thank you ({user})! You are now logged in. Click the button below to return to WhatsApp."
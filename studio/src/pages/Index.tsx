@@ -2,7 +2,7 @@ import { useState, useCallback, useRef, useEffect } from "react";
 import {
   useFrappeGetCall,
   useFrappeGetDoc,
-  useFrappeUpdateDoc,
+  useFrappePostCall,
 } from "frappe-react-sdk";
 import ReactFlow, {
   Controls,
@@ -52,10 +52,15 @@ const edgeTypes = {
 type ChatBotConfig = {
   name?: string;
   chatbot_name?: string;
-  flow_json?: string;
+  active_flow_version?: string;
   env?: string; // local, live, test
 };
 
+type FlowVersion = {
+  version?: string;
+  flow_json?: string;
+};
+
 const Index = () => {
   const [nodes, setNodes, onNodesChange] = useNodesState<ChatbotTemplate>([]);
   const [edges, setEdges, onEdgesChange] = useEdgesState([]);
@@ -81,28 +86,34 @@ const Index = () => {
   }, [nodes, edges, history, historyIndex]);
 
   const [isSaving, setIsSaving] = useState(false);
-  const { data, error, isLoading, isValidating, mutate } =
+  const { data, error, isLoading, isValidating } =
     useFrappeGetDoc<ChatBotConfig>(chatbotConfigDocName, chatbotConfigDocName);
+  // the flow is stored in versions, apart from the config
   const {
-    updateDoc,
-    loading: updating,
-    error: updateError,
-  } = useFrappeUpdateDoc<ChatBotConfig>();
+    data: flowData,
+    isLoading: isFlowLoading,
+    mutate: mutateFlow,
+  } = useFrappeGetCall<{ message: FlowVersion }>("frappe_pywce.flows.get_flow");
+  const { call: saveFlow } = useFrappePostCall<{ message: string }>(
+    "frappe_pywce.flows.save_flow"
+  );
 
   useEffect(() => {
     console.log("ChatBot Config: ", data);
     console.log("ChatBot Config Name: ", data?.chatbot_name);
 
-    if (data && !isFlowLoaded) {
+    if (data && flowData && !isFlowLoaded) {
       setIsFlowLoaded(true); 
 
-      if (data.flow_json) {
+      const flowJson = flowData.message?.flow_json;
+
+      if (flowJson) {
         let flow: ChatbotFlow;
         try {
           flow =
-            typeof data.flow_json === "string"
-              ? JSON.parse(data.flow_json)
-              : (data.flow_json as unknown as ChatbotFlow);
+            typeof flowJson === "string"
+              ? JSON.parse(flowJson)
+              : (flowJson as unknown as ChatbotFlow);
         } catch (err: any) {
           toast.error("Failed to parse flow_json: " + (err?.message ?? err));
           return;
@@ -155,7 +166,7 @@ const Index = () => {
         setEdges([]);
         saveToHistory();
       }
-    } else if (!data && !isLoading && !isFlowLoaded) {
+    } else if (!data && !isLoading && !isFlowLoading && !isFlowLoaded) {
       setIsFlowLoaded(true);
       toast.info(`Create a new chatbot to continue`);
       setNodes([]);
@@ -164,7 +175,9 @@ const Index = () => {
     }
   }, [
     data,
+    flowData,
     isLoading,
+    isFlowLoading,
     isFlowLoaded,
     edgeType,
     setNodes,
@@ -519,12 +532,10 @@ const Index = () => {
 
     console.log("Saving flow JSON: ", flowJson);
 
-    updateDoc(chatbotConfigDocName, chatbotConfigDocName, {
-      flow_json: flowJson,
-    })
+    saveFlow({ flow_json: flowJson })
       .then(async () => {
         toast.success("Flow saved!");
-        await mutate();
+        await mutateFlow();
       })
       .catch((err) => {
         console.error(err);